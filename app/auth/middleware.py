@@ -0,0 +1,87 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.roles import load_role
+from app.auth.token_cache import access_token_cache, refresh_token_cache
+from app.auth.utils import decode_token, create_access_token, access_claims, SECRET_ACCESS_KEY, SECRET_REFRESH_KEY
+from app.database.config import settings, async_session_maker
+
+# login answers 409 to any request carrying an access_token cookie,
+# logout is about to drop both cookies: neither gets a reissued one
+SKIP_PATHS = frozenset({"/users/login", "/users/logout"})
+
+
+class TokenRefreshMiddleware:
+    """Sliding sessions without the /users/action round-trip.
+
+    When the access cookie is missing, invalid or about to expire but the refresh cookie is valid,
+    a new access token is built from the refresh claims with the role read from the database,
+    swapped into this request's Cookie header so the endpoint sees it, and set on the response."""
+
+    def __init__(self, app: ASGIApp, refresh_before: int = settings.ACCESS_TOKEN_REFRESH_BEFORE):
+        self.app = app
+        self.refresh_before = refresh_before
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+        cookies = HTTPConnection(scope).cookies
+        refresh_token = cookies.get("refresh_token")
+        if not refresh_token or self._is_fresh(cookies.get("access_token")):
+            await self.app(scope, receive, send)
+            return
+        access_token = await self._reissue(refresh_token)
+        if access_token is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = MutableHeaders(scope=scope)
+        # only the access token is swapped, the other cookies are passed on byte for byte
+        parts = [part.strip() for part in headers.get("cookie", "").split(";")
+                 if part.strip() and not part.strip().startswith("access_token=")]
+        headers["cookie"] = "; ".join([*parts, f"access_token={access_token}"])
+        cookie = Response()
+        cookie.set_cookie("access_token", access_token, max_age=settings.ACCESS_TOKEN_EXPIRES_IN * 60, path="/",
+                          httponly=True, samesite="lax")
+        set_cookie = cookie.headers["set-cookie"]
+
+        async def send_with_cookie(message: Message):
+            # an endpoint that deletes or sets the cookie itself has the last word
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                if not any(value.startswith("access_token=")
+                           for value in response_headers.getlist("set-cookie")):
+                    response_headers.append("set-cookie", set_cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    def _is_fresh(self, token: str | None) -> bool:
+        if not token:
+            return False
+        try:
+            claims = decode_token(token, SECRET_ACCESS_KEY, access_token_cache)
+        except Exception:
+            return False
+        return claims.get("exp", 0) - time.time() > self.refresh_before
+
+    @staticmethod
+    async def _reissue(refresh_token: str) -> str | None:
+        try:
+            claims = decode_token(refresh_token, SECRET_REFRESH_KEY, refresh_token_cache)
+        except Exception:
+            return None
+        if not claims.get("id"):
+            return None
+        # the refresh token's role is frozen at login, a promotion or demotion since then is in the database only;
+        # one primary-key lookup per reissue
+        async with async_session_maker() as session:
+            role = await load_role(session, str(claims["id"]))
+        if role is None:
+            return None
+        return create_access_token(access_claims({**claims, "role": role}))
@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from starlette import status
+
+from app.auth.utils import hash_password, verify_password
+from app.database.config import settings
+from logging_app.metrics import metrics
+
+
+def _timed(func, *args):
+    # monotonic clock is shared between processes, so the parent can work out the queue wait
+    started = time.monotonic()
+    result = func(*args)
+    return result, started, time.monotonic()
+
+
+class PasswordPoolStats:
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    def observe(self, queue_wait: float, hash_time: float):
+        self.completed += 1
+        self.hash_seconds_total += hash_time
+        self.hash_seconds_max = max(self.hash_seconds_max, hash_time)
+        self.queue_wait_seconds_total += queue_wait
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, queue_wait)
+        metrics.observe("password_hash_seconds", hash_time)
+        metrics.observe("password_queue_wait_seconds", queue_wait)
+
+
+def cores_per_worker(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+
+class PasswordPool:
+    """Runs bcrypt in worker processes so a burst of logins doesn't block the event loop.
+    At most size + queue_limit jobs are accepted at once, the rest get 503."""
+
+    def __init__(self, size: int, queue_limit: int):
+        self.configured_size = size
+        self.size = size or cores_per_worker(1)
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.stats = PasswordPoolStats()
+        self._executor: ProcessPoolExecutor | None = None
+
+    def share_cores(self, workers: int):
+        """Each of several server workers has its own pool: by default they split the cores instead of
+        every one of them taking all of them. Called before start, an explicit size is left as it is."""
+        if not self.configured_size:
+            self.size = cores_per_worker(workers)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # forked from the forkserver rather than from this process, a server worker runs threads
+        return ProcessPoolExecutor(max_workers=self.size, mp_context=multiprocessing.get_context("forkserver"))
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.size, 0)
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.size + self.queue_limit:
+            self.stats.rejected += 1
+            metrics.inc("password_rejected_total")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Server is busy, try again later", headers={"Retry-After": "1"})
+        if self._executor is None:
+            self._executor = self._new_executor()
+        self.in_flight += 1
+        submitted = time.monotonic()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed, func, *args)
+        finally:
+            self.in_flight -= 1
+        self.stats.observe(started - submitted, finished - started)
+        return result
+
+    def start(self):
+        """Spawns the worker processes up front, otherwise the first logins pay for it."""
+        if self._executor is None:
+            self._executor = self._new_executor()
+        for _ in range(self.size):
+            self._executor.submit(int)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool(settings.PASSWORD_POOL_SIZE, settings.PASSWORD_QUEUE_LIMIT)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await password_pool.run(verify_password, password, hashed_password)
@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from app.database.config import settings
+from app.database.models import User
+from app.database.routing import on_primary
+
+ROLE_CACHE_SIZE = 10000
+
+
+class RoleCache:
+    """user_id -> (role, checked_at): the role as last read from the database or set by a role change
+    on this worker. The cache is per worker, so an entry is trusted for ttl seconds only, which bounds
+    how long a change made on another worker goes unnoticed, and only over a token issued before it."""
+
+    def __init__(self, ttl: float, maxsize: int = ROLE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._roles: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, user_id: str, newer_than: float = 0) -> str | None:
+        entry = self._roles.get(user_id)
+        if entry is None:
+            return None
+        role, checked_at = entry
+        if checked_at <= time.time() - self.ttl:
+            del self._roles[user_id]
+            return None
+        if checked_at < newer_than:
+            # the token's claim was issued after this entry and is the fresher of the two
+            return None
+        self._roles.move_to_end(user_id)
+        return role
+
+    def set(self, user_id: str, role: str):
+        self._roles[user_id] = (role, time.time())
+        self._roles.move_to_end(user_id)
+        while len(self._roles) > self.maxsize:
+            self._roles.popitem(last=False)
+
+
+role_cache = RoleCache(settings.ROLE_CACHE_TTL)
+
+
+async def load_role(session: AsyncSession, user_id: str) -> str | None:
+    # on the primary, a demotion must not wait for the replica
+    with on_primary():
+        role = (await session.execute(select(User.role).where(User.id == user_id))).scalar_one_or_none()
+    if role is not None:
+        role_cache.set(user_id, role)
+    return role
+
+
+async def get_role(session: AsyncSession, access_data: dict) -> str | None:
+    """No query in the common case: a "user" claim is taken as is, an admin claim is confirmed by
+    the database at most once per ROLE_CACHE_TTL on each worker."""
+    user_id = access_data["user_id"]
+    role = role_cache.get(user_id, newer_than=access_data.get("issued_at", 0))
+    if role is not None:
+        return role
+    if access_data.get("role") == "user":
+        return "user"
+    # admin claims and tokens issued before the role claim existed
+    return await load_role(session, user_id)
+
+
+async def require_admin(session: AsyncSession, access_data: dict):
+    if await get_role(session, access_data) != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough rights"
+        )
@@ -0,0 +1,58 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from app.database.config import settings
+
+
+class VerifiedTokenCache:
+    """LRU of tokens whose signature has already been checked, keyed by the token digest.
+    An entry lives until the token's own exp, so a cached token is never accepted for longer than a fresh one."""
+
+    def __init__(self, maxsize: int, default_ttl: int):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        if self.maxsize <= 0:
+            return
+        expires_at = claims.get("exp") or time.time() + self.default_ttl
+        key = self._key(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def evict(self, token: str | None):
+        if token:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# separate caches, so a refresh token can never be served from cache as an access token
+access_token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE, settings.ACCESS_TOKEN_EXPIRES_IN * 60)
+refresh_token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE, settings.REFRESH_TOKEN_EXPIRES_IN * 60)
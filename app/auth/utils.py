@@ -1,4 +1,5 @@
 import re
+import time
 
 from fastapi import HTTPException
 from authlib.jose import jwt
@@ -10,6 +11,7 @@ from starlette import status
 from starlette.requests import Request
 
 
+from app.auth.token_cache import VerifiedTokenCache, access_token_cache, refresh_token_cache
 from app.database.config import settings
 
 
@@ -42,8 +44,27 @@ ACCESS_TOKEN_EXPIRES_IN = settings.ACCESS_TOKEN_EXPIRES_IN
 SECRET_ACCESS_KEY = settings.PRIVATE_ACCESS_KEY
 SECRET_REFRESH_KEY = settings.PRIVATE_REFRESH_KEY
 ALGORITHM = settings.JWT_ALGORITHM
+def refresh_claims(user_id: str, nickname: str, name: str, email: str, ava_filename: str | None, role: str) -> dict:
+    return {"id": user_id, "nickname": nickname, "name": name, "email": email,
+            "ava_filename": ava_filename or "none", "role": role}
+
+
+def access_claims(refresh_payload: dict) -> dict:
+    """The access token payload. Login, /users/refresh and TokenRefreshMiddleware all build it
+    from the refresh claims, so a silently reissued token carries the same fields."""
+    return {
+        "id": refresh_payload["id"],
+        "nickname": refresh_payload.get("nickname"),
+        # refresh tokens issued before the claim was added
+        "ava_filename": refresh_payload.get("ava_filename") or "none",
+        "role": refresh_payload.get("role"),
+    }
+
+
 def create_access_token(data: dict):
     access_payload = data.copy()
+    access_payload.setdefault("iat", int(time.time()))
+    access_payload.setdefault("exp", access_payload["iat"] + ACCESS_TOKEN_EXPIRES_IN * 60)
     headers = {"alg": ALGORITHM}
     access_token = jwt.encode(
         header=headers,
@@ -54,6 +75,7 @@ def create_access_token(data: dict):
 
 def create_refresh_token(data: dict):
     refresh_payload = data.copy()
+    refresh_payload.setdefault("exp", int(time.time()) + settings.REFRESH_TOKEN_EXPIRES_IN * 60)
     headers = {"alg": ALGORITHM}
     refresh_token = jwt.encode(
         header=headers,
@@ -64,21 +86,34 @@ def create_refresh_token(data: dict):
 
 
 
+def decode_token(token: str, key: str, cache: VerifiedTokenCache) -> dict:
+    payload = cache.get(token)
+    if payload is None:
+        claims = jwt.decode(token, key)
+        claims.validate()
+        payload = dict(claims)
+        cache.put(token, payload)
+    return payload
+
+
 async def get_access_token(request: Request):
     token = request.cookies.get("access_token")
     if not token:
         return False
     try:
-        payload = jwt.decode(token, SECRET_ACCESS_KEY)
+        payload = decode_token(token, SECRET_ACCESS_KEY, access_token_cache)
     except :
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token is not valid")
 
     user_id = payload.get("id")
     nickname = payload.get("nickname")
     ava_filename = payload.get("ava_filename")
+    role = payload.get("role")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    result = {"user_id": str(user_id), "nickname": nickname, "ava_filename": str(ava_filename)}
+    result = {"user_id": str(user_id), "nickname": nickname, "ava_filename": str(ava_filename), "role": role,
+              # a cached role only beats the claim if it was read after this
+              "issued_at": payload.get("iat", 0)}
     return result
 
 
@@ -87,7 +122,7 @@ async def get_refresh_token(request: Request):
     if not token:
         return False
     try:
-        payload = jwt.decode(token, SECRET_REFRESH_KEY)
+        payload = decode_token(token, SECRET_REFRESH_KEY, refresh_token_cache)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token is not valid")
     user_id = payload.get("id")
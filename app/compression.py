@@ -0,0 +1,63 @@
+import gzip
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database.config import settings
+from app.http_cache import pick_encoding
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson")
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    # low levels: the body is compressed on every request, the best ratio is left to the static build
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """br or gzip, whichever the client prefers, for JSON bodies of at least minimum_size bytes.
+
+    Only responses sent in one piece are compressed: streams (NDJSON export, SSE) keep going out
+    as they are produced, and so do files and anything already encoded."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = pick_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start: Message | None = None
+
+        async def send_compressed(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=list(start["headers"]))
+            body = message.get("body", b"")
+            if (message["type"] == "http.response.body" and not message.get("more_body", False)
+                    and len(body) >= self.minimum_size and "content-encoding" not in headers
+                    and headers.get("content-type", "").split(";")[0].strip() in COMPRESSIBLE_TYPES):
+                body = compress(encoding, body)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                start["headers"] = headers.raw
+                message = {"type": "http.response.body", "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
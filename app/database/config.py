@@ -1,9 +1,15 @@
 
 
+import asyncio
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
+from app.database.instrumentation import instrument_engine, instrument_pool, InstrumentedPool
+from app.database.routing import RoutingSession
+
 
 class Settings(BaseSettings):
     DB_HOST: str
@@ -17,7 +23,67 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRES_IN: int
     REFRESH_TOKEN_EXPIRES_IN: int
     JWT_ALGORITHM: str = "HS256"
+    # seconds before expiry at which a request reissues the access token from the refresh token
+    ACCESS_TOKEN_REFRESH_BEFORE: int = 60
     SESSION_KEY: str
+    # seconds a role read from the database is trusted per worker, the longest a demotion made on another worker waits
+    ROLE_CACHE_TTL: float = 30
+    # "postgres" - tsvector column with a GIN index, "memory" - in-process inverted index
+    SEARCH_BACKEND: str = "postgres"
+    # bcrypt processes per server worker, 0 - the cores split between the server workers
+    PASSWORD_POOL_SIZE: int = 0
+    PASSWORD_QUEUE_LIMIT: int = 64
+    # verified JWTs kept in memory per worker, 0 disables the cache
+    TOKEN_CACHE_SIZE: int = 10000
+    LOG_JSON: bool = False
+    LOG_FILE: str = "app.log"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    # share of 2xx responses that get logged, errors are always logged
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    # shared directory for per-worker metric snapshots, unset for a single process
+    METRICS_DIR: str | None = None
+    METRICS_FLUSH_INTERVAL: float = 5.0
+    DB_ECHO: bool = False
+    # per worker: DB_POOL_SIZE + DB_MAX_OVERFLOW times the worker count must fit in max_connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT: float = 30
+    # seconds after which a connection is replaced, -1 keeps connections forever
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # prepared statements cached per connection, 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    # postgresql+asyncpg://... of a read replica for the @read_only repository methods, all on DB_URL when unset
+    READ_DB_URL: str | None = None
+    # seconds a client that wrote keeps reading from the primary
+    REPLICA_STICKY_SECONDS: float = 5
+    SLOW_QUERY_MS: float = 200
+    # the same statement issued this many times in one request is reported as a likely N+1
+    REPEATED_QUERY_THRESHOLD: int = 5
+    THUMBNAIL_POOL_SIZE: int = 1
+    # redis://... to share the idea cache between workers; unset: in-process cache, no cache under several workers
+    CACHE_URL: str | None = None
+    IDEA_CACHE_TTL: float = 60
+    IDEA_CACHE_SIZE: int = 1024
+    # redis://... to fan idea events out to the SSE subscribers of every worker, this worker only when unset
+    EVENTS_URL: str | None = None
+    # events buffered per SSE subscriber before it is considered too slow and dropped
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT: float = 15
+    # days deletions stay visible to /ideas/changes, the tombstones are pruned every TOMBSTONE_PRUNE_INTERVAL seconds
+    TOMBSTONE_RETENTION_DAYS: int = 30
+    TOMBSTONE_PRUNE_INTERVAL: float = 3600
+    # JSON bodies smaller than this are sent uncompressed
+    COMPRESSION_MIN_SIZE: int = 1024
+    # serve.py: worker processes, 0 - one per core
+    WEB_CONCURRENCY: int = 0
+    BIND: str = "0.0.0.0:8000"
+    # seconds a stopping worker gives in-flight requests before closing them
+    GRACEFUL_TIMEOUT: int = 30
+    # connections each worker opens at startup
+    DB_WARM_CONNECTIONS: int = 5
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -28,9 +94,35 @@ settings = Settings()
 
 
 
-engine = create_async_engine(url=settings.DB_URL, echo=True, future=True)
-async_session_maker = async_sessionmaker(bind=engine, class_=AsyncSession)
+def build_engine(url: str, role: str):
+    engine = create_async_engine(
+        url=url, echo=settings.DB_ECHO, future=True, poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW, pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE, pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE})
+    instrument_engine(engine.sync_engine, settings.SLOW_QUERY_MS)
+    instrument_pool(engine.sync_engine, role=role)
+    return engine
+
+
+engine = build_engine(settings.DB_URL, "primary")
+read_engine = build_engine(settings.READ_DB_URL, "replica") if settings.READ_DB_URL else None
+async_session_maker = async_sessionmaker(bind=engine, class_=AsyncSession, sync_session_class=RoutingSession,
+                                         info={"replica": read_engine})
 
 async def get_async_session():
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def warm_up_pool(connections: int):
+    """Opens the connections before the first request rather than during it, on the replica as well.
+
+    More than the pool size would only open overflow connections that are closed again right away."""
+    connections = min(connections, settings.DB_POOL_SIZE)
+    async def check_out(pooled):
+        async with pooled.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    engines = [engine] if read_engine is None else [engine, read_engine]
+    await asyncio.gather(*(check_out(pooled) for pooled in engines for _ in range(connections)))
\ No newline at end of file
@@ -0,0 +1,93 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from logging_app.metrics import metrics
+
+logger = logging.getLogger("my_app.sql")
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(statement, times) for statement, times in self.statements.items() if times >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+def start_query_tracking() -> QueryStats:
+    stats = QueryStats()
+    current_query_stats.set(stats)
+    return stats
+
+
+def redact(parameters):
+    """Keeps the shape of the bound parameters but not their values, they may hold emails and hashes."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) if isinstance(value, (dict, list, tuple)) else type(value).__name__
+                for value in parameters]
+    return type(parameters).__name__
+
+
+def instrument_engine(engine: Engine, slow_query_ms: float):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # on the execution context rather than the pooled connection, a failed statement leaves nothing behind
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_started
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.statements[statement] += 1
+        if elapsed * 1000 >= slow_query_ms:
+            logger.warning("Slow query: %.1f ms %s params=%s", elapsed * 1000, statement, redact(parameters))
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """The async queue pool, timing how long a checkout waits for a free connection."""
+
+    metric_labels: dict = {}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.inc("db_pool_timeouts_total", **self.metric_labels)
+            raise
+        finally:
+            metrics.observe("db_pool_checkout_seconds", time.perf_counter() - started, **self.metric_labels)
+
+
+def instrument_pool(engine: Engine, **labels):
+    pool = engine.pool
+    pool.metric_labels = labels
+    metrics.set_gauge("db_pool_size", pool.size(), **labels)
+
+    def record_usage(*args):
+        metrics.set_gauge("db_pool_in_use", pool.checkedout(), **labels)
+        # overflow() counts up from -size while the pool is still filling
+        metrics.set_gauge("db_pool_overflow", max(pool.overflow(), 0), **labels)
+
+    event.listen(engine, "checkout", record_usage)
+    event.listen(engine, "checkin", record_usage)
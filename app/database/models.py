@@ -1,7 +1,8 @@
 
 from uuid import uuid4
 
-from sqlalchemy import ForeignKey, UniqueConstraint, UUID, Integer, String, TIMESTAMP, text
+from sqlalchemy import ForeignKey, UniqueConstraint, UUID, Integer, String, TIMESTAMP, text, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
 
 
@@ -18,10 +19,30 @@ class Idea(Base):
     updated_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
     user_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"),nullable=False)
     nickname: Mapped[str] = mapped_column(String, nullable=False, server_default="dummy")
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')", persisted=True), deferred=True)
     user: Mapped["User"] = relationship("User", back_populates="ideas")
 
     __table_args__ = (
-    UniqueConstraint('idea_id', 'user_id', name='uc_idea_user'),)
+    UniqueConstraint('idea_id', 'user_id', name='uc_idea_user'),
+    Index('ix_ideas_updated_at_idea_id', 'updated_at', 'idea_id'),
+    Index('ux_ideas_title', 'title', unique=True),
+    Index('ix_ideas_user_id_title', 'user_id', 'title'),
+    Index('ix_ideas_search_vector', 'search_vector', postgresql_using='gin'),)
+
+
+
+class IdeaTombstone(Base):
+    __tablename__ = "idea_tombstones"
+    tombstone_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    idea_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    user_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    deleted_at: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+
+    __table_args__ = (
+    Index('ix_idea_tombstones_deleted_at_idea_id', 'deleted_at', 'idea_id'),)
 
 
 
@@ -0,0 +1,106 @@
+"""Read replica routing.
+
+Repository methods decorated with @read_only run their queries on the replica engine when
+READ_DB_URL is set. A request that commits gets a cookie that keeps the client's reads on the
+primary for REPLICA_STICKY_SECONDS, long enough for the replica to catch up with its own writes."""
+import functools
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import Insert, Update, Delete, event
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+STICKY_COOKIE = "db_primary_until"
+
+# set by @read_only, cleared again by on_primary()
+use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+# set by the middleware for clients inside their window after a write
+sticky_primary: ContextVar[bool] = ContextVar("sticky_primary", default=False)
+# one-element list per request, flipped by a commit on the primary
+request_wrote: ContextVar[list[bool] | None] = ContextVar("request_wrote", default=None)
+
+
+def read_only(method):
+    """Marks a repository method whose queries may be answered by the replica."""
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = use_replica.set(True)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            use_replica.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def on_primary():
+    token = use_replica.set(False)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+class RoutingSession(Session):
+    """Sends the reads of @read_only methods to info["replica"], everything else to the bound primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if (replica is not None and use_replica.get() and not sticky_primary.get() and not wrote_in_request()
+                and not self._flushing and not isinstance(clause, (Insert, Update, Delete))):
+            return replica.sync_engine
+        return super().get_bind(mapper, clause, **kw)
+
+
+def wrote_in_request() -> bool:
+    # a read later in the request that committed is as likely to miss the write as the next request
+    wrote = request_wrote.get()
+    return wrote is not None and wrote[0]
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def record_write(session: Session):
+    wrote = request_wrote.get()
+    if wrote is not None:
+        wrote[0] = True
+
+
+class ReplicaStickinessMiddleware:
+    def __init__(self, app: ASGIApp, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            primary_until = float(HTTPConnection(scope).cookies.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        sticky_token = sticky_primary.set(primary_until > time.time())
+        wrote = [False]
+        wrote_token = request_wrote.set(wrote)
+
+        async def send_with_cookie(message: Message):
+            # the endpoint has committed by the time the response starts, streamed bodies aside
+            if message["type"] == "http.response.start" and wrote[0]:
+                cookie = Response()
+                cookie.set_cookie(STICKY_COOKIE, f"{time.time() + self.sticky_seconds:.3f}",
+                                  max_age=math.ceil(self.sticky_seconds), path="/", httponly=True, samesite="lax")
+                MutableHeaders(scope=message).append("set-cookie", cookie.headers["set-cookie"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            request_wrote.reset(wrote_token)
+            sticky_primary.reset(sticky_token)
@@ -0,0 +1,24 @@
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def accepted_encodings(accept_encoding: str | None) -> set[str]:
+    """Codings the client takes, the ones it refuses with q=0 left out."""
+    accepted = set()
+    for candidate in (accept_encoding or "").split(","):
+        coding, *params = [part.strip() for part in candidate.split(";")]
+        if coding and not any(param.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for param in params):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def pick_encoding(accept_encoding: str | None) -> str | None:
+    accepted = accepted_encodings(accept_encoding)
+    for coding in ("br", "gzip"):
+        if coding in accepted:
+            return coding
+    return None
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field, ValidationError
+from starlette import status
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_FIELDS = ("title", "description", "created_at", "updated_at")
+IMPORT_BATCH_SIZE = 1000
+MAX_ROW_CHARS = 64 * 1024
+# the report stays small however broken the upload is, the counters are always exact
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportRow(BaseModel):
+    title: str = Field(min_length=1)
+    description: str = Field(min_length=1)
+
+
+class RowError(Exception):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Splits the request body into lines without holding more than one line in memory."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_ROW_CHARS:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"A row is longer than {MAX_ROW_CHARS} bytes")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace") + "\n"
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | RowError]]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f"invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else RowError("a row must be a JSON object")
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | RowError]]:
+    """The first row is the header. A quoted field may span lines, such a record is numbered by its first line."""
+    header = None
+    record, first_line, line_number = "", 0, 0
+    async for line in lines:
+        line_number += 1
+        if not record:
+            first_line = line_number
+        record += line
+        # an odd number of quotes means a quoted field goes on in the next line
+        if record.count('"') % 2:
+            if len(record) > MAX_ROW_CHARS:
+                yield first_line, RowError("unterminated quoted field")
+                record = ""
+            continue
+        values = next(csv.reader(io.StringIO(record)), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield first_line, RowError(f"expected {len(header)} fields, got {len(values)}")
+            continue
+        yield first_line, dict(zip(header, values))
+    if record:
+        yield first_line, RowError("unterminated quoted field")
+
+
+def parse_rows(fmt: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | RowError]]:
+    lines = iter_lines(chunks)
+    return iter_csv(lines) if fmt == "csv" else iter_ndjson(lines)
+
+
+def validate_row(row: dict | RowError) -> ImportRow:
+    if isinstance(row, RowError):
+        raise row
+    try:
+        return ImportRow.model_validate(row)
+    except ValidationError as e:
+        raise RowError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def export_header(fmt: str) -> str:
+    return ",".join(EXPORT_FIELDS) + "\r\n" if fmt == "csv" else ""
+
+
+def export_rows(fmt: str, rows: Iterable[dict]) -> str:
+    """One chunk of the export body, rows already JSON-encoded. Exported CSV imports back as is."""
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.DictWriter(out, EXPORT_FIELDS, extrasaction="ignore").writerows(rows)
+        return out.getvalue()
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.database.config import settings
+from logging_app.metrics import metrics
+
+logger = logging.getLogger("my_app.cache")
+
+
+class MemoryCacheBackend:
+    """TTL + LRU store local to the worker. Version counters live apart from the
+    entries and are never evicted, a reset counter could resurrect a stale entry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._instance = uuid.uuid4().hex[:8]
+        # workers forked from a preloaded app must not share one instance id
+        os.register_at_fork(after_in_child=self._new_instance)
+
+    def _new_instance(self):
+        self._instance = uuid.uuid4().hex[:8]
+
+    def version_tag(self, ttl: float) -> str:
+        # counters are per worker and restart from zero: the tag keeps versions of different
+        # workers apart and rolls every ttl, so a write seen by another worker is picked up as late as a cache entry
+        return f"{self._instance}.{int(time.time() // ttl)}"
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_counters(self, *keys: str) -> list[int]:
+        return [self._counters.get(key, 0) for key in keys]
+
+    async def incr(self, *keys: str):
+        for key in keys:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+
+class RedisCacheBackend:
+    """Shared between workers, eviction is left to the server's maxmemory policy.
+
+    A counter lost to eviction or a flush must not come back at a value an old ETag was built from:
+    a missing counter is created at the current time in milliseconds, above any value it reached
+    by INCR before, and SET NX lets the first worker's seed win."""
+
+    def __init__(self, url: str):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url)
+
+    def version_tag(self, ttl: float) -> str:
+        return "r"
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    @staticmethod
+    def _seed() -> int:
+        return time.time_ns() // 1_000_000
+
+    async def get_counters(self, *keys: str) -> list[int]:
+        values = await self._redis.mget(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in missing:
+                    pipe.set(key, self._seed(), nx=True)
+                    pipe.get(key)
+                seeded = dict(zip(missing, (await pipe.execute())[1::2]))
+            values = [seeded.get(key, value) for key, value in zip(keys, values)]
+        return [int(value) for value in values]
+
+    async def incr(self, *keys: str):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, self._seed(), nx=True)
+                pipe.incr(key)
+            await pipe.execute()
+
+
+class NullCacheBackend:
+    """Caches nothing. With several workers and no CACHE_URL an in-process cache would keep serving
+    a listing, and its ETag, that another worker's write has already made stale."""
+
+    def version_tag(self, ttl: float) -> str:
+        # no two responses share an ETag, a conditional request always gets the body
+        return uuid.uuid4().hex
+
+    async def get(self, key: str) -> bytes | None:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    async def get_counters(self, *keys: str) -> list[int]:
+        return [0] * len(keys)
+
+    async def incr(self, *keys: str):
+        pass
+
+
+def build_cache_backend(workers: int = 1):
+    if settings.CACHE_URL:
+        return RedisCacheBackend(settings.CACHE_URL)
+    if workers > 1:
+        logger.warning(f"No CACHE_URL with {workers} workers: the idea listings are not cached, "
+                       "set CACHE_URL to a Redis server to share one cache between them")
+        return NullCacheBackend()
+    return MemoryCacheBackend(settings.IDEA_CACHE_SIZE)
+
+
+GLOBAL_VERSION = "ideas:version:global"
+EPOCH = "ideas:version:epoch"
+
+
+def user_version_key(user_id: str) -> str:
+    return f"ideas:version:user:{user_id}"
+
+
+class IdeaCache:
+    """Read-through cache for idea listings.
+
+    Entry keys embed version counters that the write paths bump, so invalidation is one
+    INCR and old entries just age out: a user's list depends on their own counter (and the
+    epoch bumped by drop_all), the admin feed on the global counter."""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def user_key(self, user_id: str) -> str:
+        version, epoch = await self.backend.get_counters(user_version_key(user_id), EPOCH)
+        return f"ideas:user:{user_id}:{epoch}:{version}"
+
+    async def global_key(self, *parts) -> str:
+        version, = await self.backend.get_counters(GLOBAL_VERSION)
+        return ":".join(["ideas:all", str(version), *map(str, parts)])
+
+    def etag(self, key: str) -> str:
+        """The versioned key already identifies the content, so it doubles as the ETag and
+        a conditional request is answered from the counters alone."""
+        digest = hashlib.sha1(f"{self.backend.version_tag(self.ttl)}:{key}".encode("utf-8")).hexdigest()
+        return f'W/"{digest[:20]}"'
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        """The loader returns the serialized response body, a hit is sent as is without decoding."""
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            metrics.inc("idea_cache_requests_total", result="hit")
+            return cached
+        self.misses += 1
+        metrics.inc("idea_cache_requests_total", result="miss")
+        value = await loader()
+        await self.backend.set(key, value, self.ttl)
+        return value
+
+    async def invalidate_user(self, user_id: str):
+        await self.backend.incr(user_version_key(user_id), GLOBAL_VERSION)
+
+    async def invalidate_all(self):
+        await self.backend.incr(EPOCH, GLOBAL_VERSION)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+idea_cache = IdeaCache(build_cache_backend(), settings.IDEA_CACHE_TTL)
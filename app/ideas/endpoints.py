@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from starlette.requests import Request
 
 
 from app.auth.utils import get_access_token
-from app.ideas.schemas import IdeaResponse
+from app.ideas.schemas import IdeaResponse, IdeaBatch, IdeaPage, IdeaSearchPage, IdeaOut
 
 from app.repositories.idea_repository import IdeaRepository
 from app.repositories.idea_repository import get_idea_repository
@@ -16,9 +17,33 @@ async def add_idea(idea: IdeaResponse, session: IdeaRepository = Depends(get_ide
     return await session.add_idea(idea, access_data)
 
 
-@idea_router.get("/all_ideas")
-async def get_all_ideas(session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
-    return await session.get_ideas(access_data)
+@idea_router.get("/all_ideas", response_model=IdeaPage)
+async def get_all_ideas(request: Request, limit: int = Query(50, ge=1, le=500), after: str | None = None,
+                        stream: bool = False, session: IdeaRepository = Depends(get_idea_repository),
+                        access_data: dict | bool = Depends(get_access_token)):
+    if stream:
+        return await session.stream_ideas(access_data)
+    return await session.get_ideas(access_data, limit, after, request.headers.get("if-none-match"))
+
+
+@idea_router.get("/stream")
+async def stream_events(session: IdeaRepository = Depends(get_idea_repository),
+                        access_data: dict | bool = Depends(get_access_token)):
+    return await session.subscribe_to_events(access_data)
+
+
+@idea_router.post("/import")
+async def import_ideas(request: Request, fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+                       session: IdeaRepository = Depends(get_idea_repository),
+                       access_data: dict | bool = Depends(get_access_token)):
+    return await session.import_ideas(access_data, fmt, request.stream())
+
+
+@idea_router.get("/export")
+async def export_ideas(fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+                       session: IdeaRepository = Depends(get_idea_repository),
+                       access_data: dict | bool = Depends(get_access_token)):
+    return await session.export_ideas(access_data, fmt)
 
 
 @idea_router.get("/delete_all")
@@ -34,10 +59,23 @@ async def patch_idea(idea: IdeaResponse, access_data: dict | bool = Depends(get_
 async def delete_idea(title: str, access_data: dict | bool = Depends(get_access_token), session: IdeaRepository = Depends(get_idea_repository)):
     return await session.delete_idea(title, access_data)
 
-@idea_router.get("/get_ideas_by_description/{description}")
-async def get_ideas(description: str, session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
-    return await session.search_for_idea_by_description(description, access_data)
+@idea_router.post("/batch")
+async def apply_batch(batch: IdeaBatch, access_data: dict | bool = Depends(get_access_token),
+                      session: IdeaRepository = Depends(get_idea_repository)):
+    return await session.apply_batch(batch, access_data)
+
+# the server decodes %2F before routing, a term containing "/" only matches the path converter
+@idea_router.get("/get_ideas_by_description/{description:path}", response_model=IdeaSearchPage)
+async def get_ideas(description: str, page: int = Query(1, ge=1), limit: int = Query(20, ge=1, le=100),
+                    session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
+    return await session.search_for_idea_by_description(description, access_data, page, limit)
+
+@idea_router.get("/get_user_ideas", response_model=list[IdeaOut])
+async def get_ideas(request: Request, session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
+    return await session.get_ideas_by_id(access_data, request.headers.get("if-none-match"))
+
 
-@idea_router.get("/get_user_ideas")
-async def get_ideas(session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
-    return await session.get_ideas_by_id(access_data)
\ No newline at end of file
+@idea_router.get("/changes")
+async def get_changes(since: str | None = None, limit: int = Query(500, ge=1, le=5000),
+                      session: IdeaRepository = Depends(get_idea_repository), access_data: dict | bool = Depends(get_access_token)):
+    return await session.get_changes(access_data, since, limit)
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Callable
+
+from fastapi.encoders import jsonable_encoder
+
+from app.database.config import settings
+from logging_app.metrics import metrics
+
+CHANNEL = "ideas:events"
+RESET = "reset"
+CLOSED = "closed"
+# seconds before resubscribing after a lost Redis connection, doubled up to the maximum
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+logger = logging.getLogger("my_app.events")
+
+
+class LocalFanout:
+    """Delivers published events to this process only: enough for a single worker and for tests."""
+
+    def __init__(self):
+        self._deliver: Callable[[str], None] | None = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+
+    async def publish(self, message: str):
+        if self._deliver is not None:
+            self._deliver(message)
+
+    async def stop(self):
+        self._deliver = None
+
+
+class RedisFanout:
+    """Every worker publishes to and listens on one channel, so a subscriber sees writes made by any worker."""
+
+    def __init__(self, url: str, channel: str = CHANNEL):
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url)
+        self.channel = channel
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen(pubsub, deliver))
+
+    async def _listen(self, pubsub, deliver: Callable[[str], None]):
+        """Resubscribes after a lost connection, otherwise this worker's subscribers would silently
+        stop getting events while publishing still works. Ends only when cancelled by stop."""
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                    await pubsub.subscribe(self.channel)
+                    logger.info("Resubscribed to idea events")
+                async for message in pubsub.listen():
+                    delay = RECONNECT_DELAY
+                    try:
+                        deliver(message["data"].decode("utf-8"))
+                    except Exception:
+                        logger.exception("Delivering an idea event failed")
+                raise ConnectionError("the subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Idea event subscription lost, retrying in {delay:.0f} s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                    pubsub = None
+
+    async def publish(self, message: str):
+        await self._redis.publish(self.channel, message)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self._redis.aclose()
+
+
+def build_fanout():
+    if settings.EVENTS_URL:
+        return RedisFanout(settings.EVENTS_URL)
+    return LocalFanout()
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+
+    def replace_backlog(self, control: str):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(control)
+
+
+class EventHub:
+    """Publish/subscribe for idea changes behind the SSE endpoint.
+
+    Writers publish through the fan-out backend, which hands every message back to the hub of
+    each worker. A subscriber gets a bounded queue: one that falls behind is sent "reset" and
+    dropped instead of buffering without limit, the client reconnects and reloads."""
+
+    def __init__(self, backend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.subscribers: set[Subscriber] = set()
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    def close_streams(self):
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber, CLOSED)
+
+    async def stop(self):
+        self.close_streams()
+        await self.backend.stop()
+
+    async def publish(self, event_type: str, data: dict):
+        message = json.dumps({"type": event_type, **jsonable_encoder(data)}, ensure_ascii=False)
+        try:
+            await self.backend.publish(message)
+        except Exception as e:
+            # the write itself has been committed, subscribers will catch up on their next reload
+            logger.error(f"Publishing idea event failed: {e!r}")
+
+    def _deliver(self, message: str):
+        # every logged-in user may search all ideas, so every subscriber gets every event
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                metrics.inc("idea_events_dropped_total")
+                self.unsubscribe(subscriber, RESET)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        metrics.add_gauge("idea_event_subscribers", 1)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber, control: str | None = None):
+        if subscriber not in self.subscribers:
+            return
+        self.subscribers.discard(subscriber)
+        metrics.add_gauge("idea_event_subscribers", -1)
+        if control is not None:
+            subscriber.replace_backlog(control)
+
+    async def stream(self, heartbeat: float) -> AsyncIterator[str]:
+        # subscribed once the body is being sent, so the finally below is sure to run
+        subscriber = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle connection and tells a dead client apart sooner
+                    yield ": ping\n\n"
+                    continue
+                if message == CLOSED:
+                    return
+                if message == RESET:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                yield f"event: {json.loads(message)['type']}\ndata: {message}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+idea_events = EventHub(build_fanout(), settings.EVENTS_QUEUE_SIZE)
@@ -0,0 +1,96 @@
+import bisect
+import math
+import re
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# same ratio as setweight 'A' (title) vs 'B' (description) in the tsvector column
+TITLE_WEIGHT = 2.5
+DESCRIPTION_WEIGHT = 1.0
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_tsquery(text: str) -> str | None:
+    """Turns user input into a prefix tsquery, e.g. 'big ide' -> 'big:* & ide:*'."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+class InvertedIndex:
+    """In-process search index with the same semantics as the Postgres one:
+    every query token must prefix-match a term of the idea, title matches rank higher."""
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._terms_by_doc: dict[int, set[str]] = {}
+        self._docs: dict[int, dict] = {}
+        self._sorted_terms: list[str] = []
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, idea_id: int, title: str, description: str, **fields):
+        self.remove(idea_id)
+        weights: dict[str, float] = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            self._postings[token][idea_id] = weight
+        self._terms_by_doc[idea_id] = set(weights)
+        self._docs[idea_id] = {"idea_id": idea_id, "title": title, "description": description, **fields}
+        self._dirty = True
+
+    def remove(self, idea_id: int):
+        for token in self._terms_by_doc.pop(idea_id, ()):
+            postings = self._postings[token]
+            postings.pop(idea_id, None)
+            if not postings:
+                del self._postings[token]
+        if self._docs.pop(idea_id, None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        self._postings.clear()
+        self._terms_by_doc.clear()
+        self._docs.clear()
+        self._sorted_terms = []
+        self._dirty = False
+
+    def _terms_with_prefix(self, prefix: str) -> list[str]:
+        if self._dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._dirty = False
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        end = bisect.bisect_left(self._sorted_terms, prefix + "\uffff")
+        return self._sorted_terms[start:end]
+
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> list[dict]:
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        total = len(self._docs)
+        scores: dict[int, float] | None = None
+        for token in tokens:
+            token_scores: dict[int, float] = defaultdict(float)
+            for term in self._terms_with_prefix(token):
+                postings = self._postings[term]
+                idf = math.log(1 + total / len(postings))
+                for idea_id, weight in postings.items():
+                    token_scores[idea_id] = max(token_scores[idea_id], weight * idf)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {idea_id: score + token_scores[idea_id] for idea_id, score in scores.items()
+                          if idea_id in token_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[offset:offset + limit]
+        return [{**self._docs[idea_id], "rank": score} for idea_id, score in ranked]
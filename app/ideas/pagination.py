@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+from starlette import status
+
+
+def encode_cursor(updated_at: datetime, idea_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{idea_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        updated_at, idea_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(idea_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def encode_sync_cursor(changed_at: datetime, idea_id: int, synced_at: datetime) -> str:
+    """A /ideas/changes cursor: the position, plus the watermark of the last complete sync it builds on."""
+    raw = f"{changed_at.isoformat()}|{idea_id}|{synced_at.isoformat()}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_sync_cursor(cursor: str) -> tuple[datetime, int, datetime]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        parts = raw.split("|")
+        changed_at, idea_id = datetime.fromisoformat(parts[0]), int(parts[1])
+        # cursors issued before the watermark was added: the position is the best guess
+        synced_at = datetime.fromisoformat(parts[2]) if len(parts) > 2 else changed_at
+        return changed_at, idea_id, synced_at
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
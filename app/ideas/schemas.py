@@ -1,5 +1,8 @@
+import uuid
+from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 
@@ -10,3 +13,38 @@ class IdeaResponse(BaseModel):
     created_at: str = 'dummy'
     nickname: str = 'dummy'
 
+
+
+class IdeaOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    idea_id: int
+    title: str
+    description: str
+    created_at: str
+    updated_at: datetime
+    user_id: uuid.UUID
+    nickname: str
+
+
+class IdeaPage(BaseModel):
+    items: list[IdeaOut]
+    next_cursor: str | None = None
+
+
+class IdeaSearchPage(BaseModel):
+    items: list[IdeaOut]
+    next_page: int | None = None
+
+
+IdeaList = TypeAdapter(list[IdeaOut])
+
+
+class IdeaOperation(BaseModel):
+    op: Literal["update", "delete"]
+    title: str
+    description: str | None = None
+
+
+class IdeaBatch(BaseModel):
+    operations: list[IdeaOperation] = Field(min_length=1, max_length=1000)
@@ -0,0 +1,37 @@
+from sqlalchemy import select
+
+from app.database.config import settings, async_session_maker
+from app.database.models import Idea
+from app.ideas.inverted_index import InvertedIndex
+
+search_index = InvertedIndex()
+
+
+def uses_memory_index() -> bool:
+    return settings.SEARCH_BACKEND == "memory"
+
+
+def index_idea(idea_id: int, title: str, description: str, **fields):
+    if uses_memory_index():
+        search_index.add(idea_id, title, description, **fields)
+
+
+def unindex_idea(idea_id: int):
+    if uses_memory_index():
+        search_index.remove(idea_id)
+
+
+def clear_index():
+    if uses_memory_index():
+        search_index.clear()
+
+
+async def warm_search_index():
+    if not uses_memory_index():
+        return
+    async with async_session_maker() as session:
+        result = await session.stream(
+            select(Idea.idea_id, Idea.title, Idea.description, Idea.created_at, Idea.updated_at, Idea.user_id,
+                   Idea.nickname).execution_options(yield_per=1000))
+        async for row in result.mappings():
+            index_idea(**row)
@@ -1,18 +1,48 @@
+import asyncio
+import logging
 from abc import ABC
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import AsyncIterator
 
 import pytz
+import orjson
 from fastapi import Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, delete, text
+from sqlalchemy import select, delete, update, text, tuple_, func, insert, union_all, literal, null, values, column, \
+    String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse, Response
 
+from app.auth.roles import require_admin, get_role
 from app.auth.utils import get_access_token
-from app.database.config import get_async_session
-from app.database.models import Idea, User
-from app.ideas.schemas import IdeaResponse
+from app.database.config import get_async_session, async_session_maker, settings
+from app.database.routing import read_only, on_primary
+from app.database.models import Idea, User, IdeaTombstone
+from app.http_cache import etag_matches
+from app.ideas.bulk import (parse_rows, validate_row, RowError, ImportRow, ImportReport, IMPORT_BATCH_SIZE,
+                            FORMATS, export_header, export_rows)
+from app.ideas.cache import idea_cache
+from app.ideas.events import idea_events
+from app.ideas.inverted_index import build_tsquery
+from app.ideas.pagination import encode_cursor, decode_cursor, encode_sync_cursor, decode_sync_cursor
+from app.ideas.search import search_index, uses_memory_index, index_idea, unindex_idea, clear_index
+from app.ideas.schemas import IdeaResponse, IdeaBatch, IdeaPage, IdeaList
+
+# listings are per user or admin only, browsers revalidate them with If-None-Match
+LISTING_CACHE_CONTROL = "private, no-cache"
+IDEA_COLUMNS = (Idea.idea_id, Idea.title, Idea.description, Idea.created_at, Idea.updated_at, Idea.user_id,
+                Idea.nickname)
+STREAM_BATCH_SIZE = 500
+# past every idea_id (a 32-bit serial), a cursor at the watermark skips all rows stamped with it
+MAX_IDEA_ID = 2 ** 31 - 1
+# rows stamped within this window may still belong to uncommitted transactions, they're left for the next sync
+CHANGES_SETTLE_WINDOW = timedelta(seconds=2)
+# deletions are reported to /changes for this long, an older cursor has to sync from scratch
+TOMBSTONE_RETENTION = timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+logger = logging.getLogger("my_app.ideas")
 
 
 async def get_idea_repository(session: AsyncSession = Depends(get_async_session)):
@@ -47,63 +77,184 @@ class IdeaRepository(AbstractIdeaRepository):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail="Update your access token")
-        idea_in_db = await self.session.execute(select(Idea).filter(Idea.title == idea.title))
-        idea_in_db = idea_in_db.scalar_one_or_none()
-        if idea_in_db:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Such idea already exists"
-            )
         idea.user_id = access_data["user_id"]
         created_at = datetime.now(tz=pytz.timezone("Europe/Moscow"))
         idea.created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
         idea.nickname = access_data["nickname"]
+        # the unique title index decides, so two concurrent adds of one title can't both get in
+        stmt = (pg_insert(Idea).values(**idea.model_dump())
+                .on_conflict_do_nothing(index_elements=[Idea.title])
+                .returning(Idea.idea_id, Idea.updated_at))
         try:
-            to_add = Idea(**idea.model_dump())
-            self.session.add(to_add)
+            inserted = (await self.session.execute(stmt)).one_or_none()
             await self.session.commit()
-            await self.session.refresh(to_add)
         except Exception as e:
             await self.session.rollback()
             return JSONResponse(content=f"something went wrong, details: {e.__str__()}",
                                 status_code=status.HTTP_400_BAD_REQUEST)
+        if inserted is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Such idea already exists"
+            )
+        added = dict(idea.model_dump(), idea_id=inserted.idea_id, updated_at=inserted.updated_at)
+        index_idea(**added)
+        await idea_cache.invalidate_user(access_data["user_id"])
+        await idea_events.publish("created", added)
         return {"info": f"{access_data['nickname']} has just created the idea with title {idea.title}",
                 "description": idea.description}
 
-    async def get_ideas(self, access_data: dict | bool = Depends(get_access_token)):
+    @read_only
+    async def get_ideas(self, access_data: dict | bool = Depends(get_access_token), limit: int = 50,
+                        after: str | None = None, if_none_match: str | None = None):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="Refresh your access token")
-        query = await self.session.execute(select(User).where(User.id == access_data["user_id"]))
-        query = query.scalar_one_or_none()
-        if query.role != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough rights"
-            )
+        await require_admin(self.session, access_data)
+        # keyset pagination: (updated_at, idea_id) is unique and an updated idea moves to the end of the feed
+        stmt = select(*IDEA_COLUMNS).order_by(Idea.updated_at, Idea.idea_id).limit(limit + 1)
+        if after:
+            stmt = stmt.where(tuple_(Idea.updated_at, Idea.idea_id) > tuple_(*decode_cursor(after)))
+
+        async def load_page():
+            # an entry filled from a lagging replica would outlive the write for the whole TTL
+            with on_primary():
+                rows = (await self.session.execute(stmt)).mappings().all()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["idea_id"])
+            page = IdeaPage(items=[dict(row) for row in rows], next_cursor=next_cursor)
+            return page.model_dump_json().encode("utf-8")
+
+        key = await idea_cache.global_key(limit, after)
+        headers = {"ETag": idea_cache.etag(key), "Cache-Control": LISTING_CACHE_CONTROL}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         try:
-            data = await self.session.execute(select(Idea))
-            data = data.scalars().all()
-            return data
+            body = await idea_cache.get_or_load(key, load_page)
         except Exception as e:
-            return {"Error occurred during fetching data": e}
+            # a dict here would fail response_model=IdeaPage and turn into an opaque 500
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                detail=f"Error occurred during fetching data: {e}")
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def stream_ideas(self, access_data: dict | bool = Depends(get_access_token)):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Refresh your access token")
+        await require_admin(self.session, access_data)
+
+        async def rows():
+            # the request session is closed before the body is sent, so the cursor needs its own one
+            async with async_session_maker() as session:
+                result = await session.stream(
+                    select(*IDEA_COLUMNS).order_by(Idea.updated_at, Idea.idea_id)
+                    .execution_options(yield_per=STREAM_BATCH_SIZE))
+                async for row in result.mappings():
+                    # orjson encodes the datetime and UUID columns natively
+                    yield orjson.dumps(dict(row), option=orjson.OPT_APPEND_NEWLINE)
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    async def subscribe_to_events(self, access_data: dict | bool = Depends(get_access_token)):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Log in to follow ideas")
+        # the same audience as /get_ideas_by_description: any logged-in user sees every idea
+        return StreamingResponse(idea_events.stream(settings.EVENTS_HEARTBEAT),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def import_ideas(self, access_data: dict | bool = Depends(get_access_token), fmt: str = "ndjson",
+                           chunks: AsyncIterator[bytes] = None):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Update your access token")
+        report = ImportReport()
+        created_at = datetime.now(tz=pytz.timezone("Europe/Moscow")).strftime("%Y-%m-%d %H:%M:%S")
+        batch: list[tuple[int, ImportRow]] = []
+        try:
+            async for line, row in parse_rows(fmt, chunks):
+                try:
+                    batch.append((line, validate_row(row)))
+                except RowError as e:
+                    report.error(line, str(e))
+                    continue
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await self._import_batch(batch, access_data, created_at, report)
+                    batch = []
+            if batch:
+                await self._import_batch(batch, access_data, created_at, report)
+        finally:
+            # batches are committed as they go, those are visible even if the upload breaks off later
+            if report.imported:
+                await idea_cache.invalidate_user(access_data["user_id"])
+                # one event for the whole upload, subscribers reload instead of receiving every row
+                await idea_events.publish("imported", dict(user_id=access_data["user_id"], count=report.imported))
+        return report.as_dict()
+
+    async def _import_batch(self, batch: list[tuple[int, ImportRow]], access_data: dict, created_at: str,
+                            report: ImportReport):
+        """One multi-row INSERT ... ON CONFLICT and one commit per batch, rows whose title is taken are skipped."""
+        new_ideas = [dict(title=row.title, description=row.description, created_at=created_at,
+                       user_id=access_data["user_id"], nickname=access_data["nickname"]) for _, row in batch]
+        try:
+            inserted = await self.session.execute(
+                pg_insert(Idea).on_conflict_do_nothing(index_elements=[Idea.title])
+                .returning(Idea.idea_id, Idea.title, Idea.updated_at), new_ideas)
+            inserted = {title: (idea_id, updated_at) for idea_id, title, updated_at in inserted.all()}
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            for line, _ in batch:
+                report.error(line, f"batch failed: {e}")
+            return
+        for (line, _), value in zip(batch, new_ideas):
+            # a title that is repeated within the upload is skipped too, after its first row got in
+            row = inserted.pop(value["title"], None)
+            if row is None:
+                report.error(line, "Such idea already exists")
+                continue
+            report.imported += 1
+            index_idea(row[0], updated_at=row[1], **value)
+
+    async def export_ideas(self, access_data: dict | bool = Depends(get_access_token), fmt: str = "ndjson"):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Update your access token")
+        user_id = access_data["user_id"]
+
+        async def body():
+            yield export_header(fmt)
+            # the request session is closed before the body is sent, so the cursor needs its own one
+            async with async_session_maker() as session:
+                result = await session.stream(
+                    select(Idea.title, Idea.description, Idea.created_at, Idea.updated_at)
+                    .where(Idea.user_id == user_id).order_by(Idea.idea_id)
+                    .execution_options(yield_per=STREAM_BATCH_SIZE))
+                async for rows in result.mappings().partitions():
+                    yield export_rows(fmt, jsonable_encoder([dict(row) for row in rows]))
+
+        return StreamingResponse(body(), media_type=FORMATS[fmt],
+                                 headers={"Content-Disposition": f'attachment; filename="ideas.{fmt}"'})
 
     async def drop_all_ideas(self, access_data: dict | bool = Depends(get_access_token)):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="Refresh your access token")
-        query = await self.session.execute(select(User).where(User.id == access_data["user_id"]))
-        query = query.scalar_one_or_none()
-        if query.role != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough rights"
-            )
+        await require_admin(self.session, access_data)
         # only for admins!!
         try:
             await self.session.execute(text(f"ALTER SEQUENCE ideas_idea_id_seq RESTART WITH 1;"))
+            await self.session.execute(
+                insert(IdeaTombstone).from_select(["idea_id", "title", "user_id"],
+                                                  select(Idea.idea_id, Idea.title, Idea.user_id)))
             await self.session.execute(delete(Idea))
             await self.session.commit()
+            clear_index()
+            await idea_cache.invalidate_all()
+            await idea_events.publish("cleared", {})
         except Exception as e:
             await self.session.rollback()
             return {"Error occurred during deleting all ideas": e.__str__()}
@@ -112,40 +263,113 @@ class IdeaRepository(AbstractIdeaRepository):
     async def update_idea(self, idea: IdeaResponse, access_data: dict | bool = Depends(get_access_token)):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh your access token")
-        query = await self.session.execute(
-            select(Idea).filter(Idea.user_id == access_data["user_id"], Idea.title == idea.title))
-        query = query.scalar_one_or_none()
-        if not query:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Such idea doesn't exist")
-        query.title = idea.title
-        query.description = idea.description
-        query.updated_at = datetime.now(tz=pytz.UTC)
+        stmt = (update(Idea)
+                .where(Idea.user_id == access_data["user_id"], Idea.title == idea.title)
+                .values(description=idea.description, updated_at=func.now())
+                .returning(*IDEA_COLUMNS))
         try:
+            updated = (await self.session.execute(stmt)).mappings().one_or_none()
             await self.session.commit()
-            return f"{access_data['nickname']} has just updated the idea with title {idea.title}"
         except Exception as e:
             await self.session.rollback()
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={e.__name__: e.__str__()})
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.__str__())
+        if updated is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Such idea doesn't exist")
+        index_idea(**updated)
+        await idea_cache.invalidate_user(access_data["user_id"])
+        await idea_events.publish("updated", dict(updated))
+        return f"{access_data['nickname']} has just updated the idea with title {idea.title}"
 
     async def delete_idea(self, title: str, access_data: dict | bool = Depends(get_access_token)):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="refresh your access token")
-        query = await self.session.execute(
-            select(Idea).filter(Idea.user_id == access_data["user_id"], Idea.title == title))
-        query = query.scalar_one_or_none()
-        if not query:
+        # the delete and its tombstone go out as one statement
+        deleted = (delete(Idea)
+                   .where(Idea.user_id == access_data["user_id"], Idea.title == title)
+                   .returning(Idea.idea_id, Idea.title, Idea.user_id)
+                   .cte("deleted"))
+        stmt = (insert(IdeaTombstone)
+                .from_select(["idea_id", "title", "user_id"], select(deleted.c.idea_id, deleted.c.title,
+                                                                     deleted.c.user_id))
+                .returning(IdeaTombstone.idea_id))
+        try:
+            idea_id = (await self.session.execute(stmt)).scalar_one_or_none()
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.__str__())
+        if idea_id is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="You don't have such idea")
+        unindex_idea(idea_id)
+        await idea_cache.invalidate_user(access_data["user_id"])
+        await idea_events.publish("deleted", dict(idea_id=idea_id, title=title, user_id=access_data["user_id"]))
+        return JSONResponse(status_code=status.HTTP_200_OK,
+                            content=f"{access_data['nickname']} has just deleted the idea: {title}")
+
+    async def apply_batch(self, batch: IdeaBatch, access_data: dict | bool = Depends(get_access_token)):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="refresh your access token")
+        user_id = access_data["user_id"]
+        results = [{"op": item.op, "title": item.title} for item in batch.operations]
+        updates, deletes, seen = {}, {}, set()
+        for position, item in enumerate(batch.operations):
+            if item.title in seen:
+                results[position].update(status="error", detail="The title is repeated in the batch")
+            elif item.op == "update" and item.description is None:
+                results[position].update(status="error", detail="description is required for update")
+            elif item.op == "update":
+                updates[item.title] = (position, item.description)
+            else:
+                deletes[item.title] = position
+            seen.add(item.title)
+
+        updated, deleted = [], []
         try:
-            await self.session.delete(query)
+            # one UPDATE ... FROM (VALUES ...) and one DELETE feeding the tombstones, whatever the batch size
+            if updates:
+                changes = values(column("title", String), column("description", String), name="changes").data(
+                    [(title, description) for title, (_, description) in updates.items()])
+                result = await self.session.execute(
+                    update(Idea)
+                    .where(Idea.user_id == user_id, Idea.title == changes.c.title)
+                    .values(description=changes.c.description, updated_at=func.now())
+                    .returning(*IDEA_COLUMNS))
+                updated = result.mappings().all()
+            if deletes:
+                removed = (delete(Idea)
+                           .where(Idea.user_id == user_id, Idea.title.in_(list(deletes)))
+                           .returning(Idea.idea_id, Idea.title, Idea.user_id)
+                           .cte("removed"))
+                result = await self.session.execute(
+                    insert(IdeaTombstone)
+                    .from_select(["idea_id", "title", "user_id"],
+                                 select(removed.c.idea_id, removed.c.title, removed.c.user_id))
+                    .returning(IdeaTombstone.idea_id, IdeaTombstone.title))
+                deleted = result.all()
             await self.session.commit()
-            return JSONResponse(status_code=status.HTTP_200_OK,
-                                content=f"{access_data['nickname']} has just deleted the idea: {title}")
         except Exception as e:
             await self.session.rollback()
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUESTM, detail=e.__str__())
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.__str__())
 
+        # what RETURNING didn't give back matched no idea of this user
+        for position in [*(position for position, _ in updates.values()), *deletes.values()]:
+            results[position].update(status="not_found", detail="You don't have such idea")
+        for idea in updated:
+            results[updates[idea["title"]][0]] = {"op": "update", "title": idea["title"], "status": "updated"}
+            index_idea(**idea)
+            await idea_events.publish("updated", dict(idea))
+        for idea_id, title in deleted:
+            results[deletes[title]] = {"op": "delete", "title": title, "status": "deleted"}
+            unindex_idea(idea_id)
+            await idea_events.publish("deleted", dict(idea_id=idea_id, title=title, user_id=user_id))
+        if updated or deleted:
+            await idea_cache.invalidate_user(user_id)
+        return {"results": results, "updated": len(updated), "deleted": len(deleted)}
+
+    @read_only
     async def search_for_idea_by_description(self, description: str,
-                                             access_data: dict | bool = Depends(get_access_token)):
+                                             access_data: dict | bool = Depends(get_access_token),
+                                             page: int = 1, limit: int = 20):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="Log in to search for ideas"
@@ -155,24 +379,113 @@ class IdeaRepository(AbstractIdeaRepository):
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="User doesn't exist")
-        query = await self.session.execute(
-            select(Idea).filter(Idea.description.like(f"%{description}%")))
-        query = query.scalars().all()
-        if not query:
+        tsquery = build_tsquery(description)
+        if not tsquery:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Nothing has been found")
+        offset = (page - 1) * limit
+        # one extra row tells whether there is a next page
+        if uses_memory_index():
+            ideas = search_index.search(description, limit + 1, offset)
+        else:
+            rank = func.ts_rank_cd(Idea.search_vector, func.to_tsquery("simple", tsquery)).label("rank")
+            query = await self.session.execute(
+                select(*IDEA_COLUMNS, rank)
+                .where(Idea.search_vector.op("@@")(func.to_tsquery("simple", tsquery)))
+                .order_by(rank.desc(), Idea.idea_id)
+                .limit(limit + 1).offset(offset))
+            ideas = [dict(row) for row in query.mappings().all()]
+        if not ideas:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail="Nothing has been found")
-        return query
+        return {"items": ideas[:limit], "next_page": page + 1 if len(ideas) > limit else None}
 
-    async def get_ideas_by_id(self, access_data: dict | bool = Depends(get_access_token)):
+    @read_only
+    async def get_ideas_by_id(self, access_data: dict | bool = Depends(get_access_token),
+                              if_none_match: str | None = None):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail="Log in to search for ideas"
                                 )
-        user = await self.session.execute(select(User).filter(User.id == access_data["user_id"]))
-        user = user.scalar_one_or_none()
 
-        ideas = await self.session.execute(select(Idea).filter(Idea.user_id == access_data["user_id"]))
-        ideas = ideas.scalars().all()
-        if not ideas:
+        async def load_ideas():
+            with on_primary():
+                ideas = await self.session.execute(
+                    select(*IDEA_COLUMNS).filter(Idea.user_id == access_data["user_id"]).order_by(Idea.idea_id))
+            return IdeaList.dump_json(IdeaList.validate_python([dict(row) for row in ideas.mappings().all()]))
+
+        key = await idea_cache.user_key(access_data["user_id"])
+        headers = {"ETag": idea_cache.etag(key), "Cache-Control": LISTING_CACHE_CONTROL}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        ideas = await idea_cache.get_or_load(key, load_ideas)
+        if ideas == b"[]":
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User has no ideas")
-        return ideas
+        return Response(ideas, media_type="application/json", headers=headers)
+
+    async def get_changes(self, access_data: dict | bool = Depends(get_access_token), since: str | None = None,
+                          limit: int = 500):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Log in to sync ideas")
+        # admins sync every idea like in the admin feed, users only their own
+        is_admin = await get_role(self.session, access_data) == "admin"
+        # now() is fixed for the transaction: the watermark is the exact bound the queries below use
+        settled = (await self.session.execute(select(func.now() - CHANGES_SETTLE_WINDOW))).scalar_one()
+        changed = (select(Idea.idea_id, Idea.title, Idea.description, Idea.created_at, Idea.user_id, Idea.nickname,
+                          Idea.updated_at.label("changed_at"), literal(False).label("deleted"))
+                   .where(Idea.updated_at <= settled))
+        if not is_admin:
+            changed = changed.where(Idea.user_id == access_data["user_id"])
+        if since:
+            changed_at, idea_id, synced_at = decode_sync_cursor(since)
+            # deletions after the last complete sync are needed, the pruner may have removed the older ones
+            if synced_at < settled - TOMBSTONE_RETENTION:
+                raise HTTPException(status_code=status.HTTP_410_GONE,
+                                    detail="The cursor is older than the deletion history, sync from scratch")
+            after = tuple_(changed_at, idea_id)
+            changed = changed.where(tuple_(Idea.updated_at, Idea.idea_id) > after)
+            deleted = (select(IdeaTombstone.idea_id, IdeaTombstone.title, null(), null(), IdeaTombstone.user_id,
+                              null(), IdeaTombstone.deleted_at, literal(True))
+                       .where(IdeaTombstone.deleted_at <= settled,
+                              tuple_(IdeaTombstone.deleted_at, IdeaTombstone.idea_id) > after))
+            if not is_admin:
+                deleted = deleted.where(IdeaTombstone.user_id == access_data["user_id"])
+            changes = union_all(changed, deleted).subquery()
+        else:
+            # a first sync has nothing to delete yet
+            synced_at = settled
+            changes = changed.subquery()
+        rows = await self.session.execute(
+            select(changes).order_by(changes.c.changed_at, changes.c.idea_id).limit(limit + 1))
+        rows = rows.mappings().all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if has_more:
+            # the next page still builds on the same sync
+            next_cursor = encode_sync_cursor(rows[-1]["changed_at"], rows[-1]["idea_id"], synced_at)
+        else:
+            # caught up: everything up to the watermark has been sent, an idle client moves along with it
+            next_cursor = encode_sync_cursor(settled, MAX_IDEA_ID, settled)
+        return {
+            "changed": [{key: value for key, value in row.items() if key != "deleted"}
+                        for row in rows if not row["deleted"]],
+            # the client applies deletions first: ids restart after drop_all and may be reused by "changed"
+            "deleted": [{"idea_id": row["idea_id"], "title": row["title"], "user_id": row["user_id"],
+                         "deleted_at": row["changed_at"]} for row in rows if row["deleted"]],
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+
+
+async def run_tombstone_pruner(interval: float):
+    """Deletes the tombstones /changes no longer reports. Every worker runs one, the DELETE is idempotent."""
+    while True:
+        try:
+            async with async_session_maker() as session:
+                await session.execute(delete(IdeaTombstone)
+                                      .where(IdeaTombstone.deleted_at < func.now() - TOMBSTONE_RETENTION))
+                await session.commit()
+        except Exception:
+            logger.exception("Pruning idea tombstones failed")
+        await asyncio.sleep(interval)
@@ -4,18 +4,32 @@ from abc import ABC, abstractmethod
 
 from fastapi import Depends, HTTPException, UploadFile, File
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.responses import JSONResponse, Response, FileResponse
 
-from app.auth.utils import validate_password, hash_password, verify_password, create_access_token, create_refresh_token, \
-    get_access_token, get_refresh_token
+from app.auth.password_pool import hash_password_async, verify_password_async
+from app.auth.roles import role_cache
+from app.auth.token_cache import access_token_cache, refresh_token_cache
+from app.auth.utils import validate_password, create_access_token, create_refresh_token, \
+    get_access_token, get_refresh_token, refresh_claims, access_claims
 from app.database.config import get_async_session, settings
+from app.database.routing import read_only
 from app.database.models import User, Idea
-from app.users.schemas import UserCreate, UserLogin
-
+from app.http_cache import etag_matches
+from app.users.avatars import EXTENSIONS, MAX_AVATAR_BYTES, AVATAR_CACHE_CONTROL, AvatarTooLarge, receive_avatar, \
+    place_avatar, discard_upload, avatar_lock, delete_avatar_file, avatar_cache, avatar_owners, media_type_for, read_avatar, \
+    stat_or_none
+from app.users.thumbnails import thumbnail_pool, delete_variants, pick_variant_size, variant_path, \
+    VARIANT_MEDIA_TYPE, VARIANT_SIZES
+from app.users.schemas import UserCreate, UserLogin, UserOut
+
+# everything UserOut shows, the password hash is never loaded for a response
+USER_COLUMNS = (User.id, User.nickname, User.first_name, User.last_name, User.email, User.role, User.avatar_filename,
+                User.created_at)
 
 async def get_user_repository(session: AsyncSession = Depends(get_async_session)):
     return UserRepository(session)
@@ -37,7 +51,7 @@ class AbstractUserRepository(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    async def log_out(self, resp: Response, refresh_data: dict | bool = Depends(get_refresh_token)):
+    async def log_out(self, resp: Response, request: Request, refresh_data: dict | bool = Depends(get_refresh_token)):
         raise NotImplementedError
 
     @abstractmethod
@@ -69,17 +83,35 @@ class UserRepository(AbstractUserRepository):
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    @read_only
     async def get_user_by_id(self, access_data: dict | bool = Depends(get_access_token)):
         if not access_data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log in to continue")
-        user = await self.session.execute(select(User).filter(User.id == access_data["user_id"]))
-        user = user.scalar_one_or_none()
+        user = await self.session.execute(select(*USER_COLUMNS).filter(User.id == access_data["user_id"]))
+        user = user.mappings().one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User doesn't exist"
             )
-        return user
+        return UserOut.model_validate(dict(user))
+
+    @read_only
+    async def get_profile(self, access_data: dict | bool = Depends(get_access_token)):
+        if not access_data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log in to continue")
+        # the user row and the number of their ideas in one round-trip
+        ideas_count = (select(func.count(Idea.idea_id)).where(Idea.user_id == User.id)
+                       .correlate(User).scalar_subquery())
+        profile = await self.session.execute(
+            select(*USER_COLUMNS, ideas_count.label("ideas_count")).filter(User.id == access_data["user_id"]))
+        profile = profile.mappings().one_or_none()
+        if not profile:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User doesn't exist"
+            )
+        return UserOut.model_validate(dict(profile)), profile["ideas_count"]
 
     async def get_user_by_avatar(self, filename: str):
         user = await self.session.execute(select(User).filter(User.avatar_filename == filename))
@@ -92,14 +124,36 @@ class UserRepository(AbstractUserRepository):
                 detail="Sign in to continue"
             )
         try:
-            user = await self.session.execute(select(User).filter(User.avatar_filename == access_data["ava_filename"]))
+            user = await self.session.execute(select(User).filter(User.id == access_data["user_id"]))
             user = user.scalar_one_or_none()
             if user:
+                old_filename = user.avatar_filename
                 user.avatar_filename = "none"
                 self.session.add(user)
                 await self.session.commit()
+                avatar_owners.discard(old_filename, access_data["user_id"])
+                await self.collect_avatar(old_filename)
         except Exception as e:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"Error": e})
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"Error": e.__str__()})
+
+    async def collect_avatar(self, filename: str | None):
+        """Deletes the avatar file once no user points to it any more, identical avatars share one file."""
+        if not filename or filename == "none":
+            return
+        try:
+            # an upload of the same image places the file and commits its reference under the same lock:
+            # either the count sees the reference, or the upload comes after the deletion and writes the file again
+            await self.session.execute(avatar_lock(filename))
+            references = await self.session.execute(
+                select(func.count(User.id)).filter(User.avatar_filename == filename))
+            if not references.scalar_one():
+                self.forget_avatar(filename)
+                await run_in_threadpool(delete_avatar_file, self.UPLOAD_FOLDER, filename)
+                await run_in_threadpool(delete_variants, self.UPLOAD_FOLDER, filename)
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
 
     async def create_user(self, payload: UserCreate, response: Response):
         user = await self.session.execute(select(User).filter(User.email == payload.email))
@@ -117,19 +171,10 @@ class UserRepository(AbstractUserRepository):
                 detail='Password must be > 8, contain at least one uppercase letter and must contain one lowercase letter')
         try:
             user_id = str(uuid.uuid4())
-            jwt_payload_access = {
-                "id": user_id,
-                "nickname": payload.nickname,
-                "ava_filename": "none"
-            }
-            jwt_payload_refresh = {
-                "id": user_id,
-                "nickname": payload.nickname,
-                "name": payload.first_name,
-                "email": payload.email,
-                "role": jsonable_encoder(payload.role),
-            }
-            payload.password = hash_password(payload.password)
+            jwt_payload_refresh = refresh_claims(user_id, payload.nickname, payload.first_name, payload.email, "none",
+                                                 "user")
+            jwt_payload_access = access_claims(jwt_payload_refresh)
+            payload.password = await hash_password_async(payload.password)
             payload.id = user_id
             payload.role = "user"
 
@@ -168,23 +213,14 @@ class UserRepository(AbstractUserRepository):
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User doesn't exist"
             )
-        if not verify_password(creds.password, user.password):
+        if not await verify_password_async(creds.password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect password"
             )
 
-        jwt_payload_access = {
-            "id": jsonable_encoder(user.id),
-            "nickname": user.nickname,
-            "ava_filename": jsonable_encoder(user.avatar_filename)
-        }
-        jwt_payload_refresh = {
-            "id": jsonable_encoder(user.id),
-            "nickname": user.nickname,
-            "name": user.first_name,
-            "email": user.email,
-            "role": jsonable_encoder(user.role),
-        }
+        jwt_payload_refresh = refresh_claims(jsonable_encoder(user.id), user.nickname, user.first_name, user.email,
+                                             user.avatar_filename, jsonable_encoder(user.role))
+        jwt_payload_access = access_claims(jwt_payload_refresh)
         access_token = create_access_token(jwt_payload_access)  # secret_key=settings.JWT_PRIVATE_KEY
         refresh_token = create_refresh_token(jwt_payload_refresh)
 
@@ -208,67 +244,110 @@ class UserRepository(AbstractUserRepository):
                 detail="File not specified"
             )
 
-        max_file_size_mb = 10
-        max_file_size_bytes = max_file_size_mb * 1024 * 1024
-
-        if file.size > max_file_size_bytes:
+        # bodies far over the limit never get here (UploadSizeLimitMiddleware), the exact limit is enforced while copying
+        if file.size is not None and file.size > MAX_AVATAR_BYTES:
             raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
             # Получение типа MIME
         content_type = file.content_type
-        allowed_types = {
-            "image/jpeg",
-            "image/png",
-            "image/gif",  # Или другие типы изображений
-        }
-
-        if content_type not in allowed_types:
+        if content_type not in EXTENSIONS:
             raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported file type")
 
         try:
+            tmp_path, filename = await run_in_threadpool(receive_avatar, file.file, self.UPLOAD_FOLDER,
+                                                         EXTENSIONS[content_type])
+        except AvatarTooLarge:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
 
-            unique_filename = str(uuid.uuid4()) + file.filename.split(".")[-1]
-            filepath = os.path.join(self.UPLOAD_FOLDER, unique_filename)
-            with open(filepath, "wb") as f:
-                content = await file.read()
-                f.write(content)
-
-            user = await self.session.execute(select(User).filter(User.id == access_data["user_id"]))
-            user = user.scalar_one_or_none()
-            await self.session.execute(update(User).filter(User.id == user.id).values(avatar_filename=unique_filename))
+        try:
+            await self.session.execute(avatar_lock(filename))
+            await run_in_threadpool(place_avatar, self.UPLOAD_FOLDER, tmp_path, filename)
+            old_filename = await self.session.execute(
+                select(User.avatar_filename).filter(User.id == access_data["user_id"]))
+            old_filename = old_filename.scalar_one_or_none()
+            await self.session.execute(
+                update(User).filter(User.id == access_data["user_id"]).values(avatar_filename=filename))
             await self.session.commit()
         except Exception as e:
             await self.session.rollback()
+            await run_in_threadpool(discard_upload, tmp_path)
+            await self.collect_avatar(filename)
             return JSONResponse({"message": f"Loading error: {e}"}, status_code=500)
-        return JSONResponse({"filename": unique_filename})
-
-    async def serve_avatar(self, filename: str):
-        filepath = os.path.join(self.UPLOAD_FOLDER, filename)
-        if os.path.exists(filepath):
-            if await self.get_user_by_avatar(filename):
-                return StreamingResponse(
-                    (open(filepath, "rb")),
-                    media_type="image/",  # Crucial!
-                    headers={"Content-Disposition": f"inline; filename={filename}"},
-                )
-            else:
-                return HTTPException(status_code=404,
-                                     detail="File not found or avatar no longer associated with any user.")
+        avatar_owners.add(filename, access_data["user_id"])
+        if not os.path.exists(variant_path(self.UPLOAD_FOLDER, filename, pick_variant_size(0))):
+            thumbnail_pool.schedule(self.UPLOAD_FOLDER, filename)
+        if old_filename != filename:
+            avatar_owners.discard(old_filename, access_data["user_id"])
+            await self.collect_avatar(old_filename)
+        return JSONResponse({"filename": filename})
+
+    @staticmethod
+    def forget_avatar(filename: str):
+        avatar_owners.forget(filename)
+        avatar_cache.evict(filename)
+        for size in VARIANT_SIZES:
+            avatar_cache.evict(f"{filename}_{size}")
+
+    async def avatar_has_owner(self, filename: str) -> bool:
+        if avatar_owners.has_owner(filename):
+            return True
+        # another worker may have stored the upload
+        user = await self.get_user_by_avatar(filename)
+        if user:
+            avatar_owners.add(filename, str(user.id))
+        return bool(user)
+
+    async def serve_avatar(self, filename: str, request: Request, size: int | None = None):
+        filename = os.path.basename(filename)
+        cache_key, media_type = filename, media_type_for(filename)
+        # one stat per request, reused for the read and by FileResponse
+        stat_result = None
+        if size:
+            # until the background job has written the variant the original is served
+            size = pick_variant_size(size)
+            filepath = variant_path(self.UPLOAD_FOLDER, filename, size)
+            stat_result = stat_or_none(filepath)
+            if stat_result is not None:
+                cache_key, media_type = f"{filename}_{size}", VARIANT_MEDIA_TYPE
+        if stat_result is None:
+            filepath = os.path.join(self.UPLOAD_FOLDER, filename)
+            stat_result = stat_or_none(filepath)
+        # the owners and the memory tier are per worker, the file is deleted by whichever worker collected it
+        # (variants along with it): without it they are stale here whatever they say
+        if stat_result is None:
+            self.forget_avatar(filename)
+            raise HTTPException(status_code=404, detail="File not found")
+        if not await self.avatar_has_owner(filename):
+            raise HTTPException(status_code=404,
+                                detail="File not found or avatar no longer associated with any user.")
+        # a file name never changes its content, so the name itself is a strong validator
+        headers = {"ETag": f'"{cache_key}"', "Cache-Control": AVATAR_CACHE_CONTROL,
+                   "Content-Disposition": f"inline; filename={filename}"}
+        if cache_key == filename and size:
+            # the original stands in for a variant, it must be revalidated once the variant exists
+            headers["Cache-Control"] = "no-cache"
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        content = avatar_cache.get(cache_key)
+        if content is not None:
+            return Response(content, media_type=media_type, headers=headers)
+        try:
+            content = await run_in_threadpool(read_avatar, filepath, stat_result)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        if content is not None:
+            avatar_cache.put(cache_key, content)
+            return Response(content, media_type=media_type, headers=headers)
+        return FileResponse(filepath, media_type=media_type, headers=headers, stat_result=stat_result)
 
     async def refresh(self, response: Response, access_data: dict | bool = Depends(get_access_token),
                       refresh_data: dict | bool = Depends(get_refresh_token)):
         if not refresh_data:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Log in to continue")
-        user = await self.session.get(User, refresh_data["user_id"])
         if not access_data:
-            jwt_payload_access = {
-                "id": jsonable_encoder(user.id),
-                "nickname": user.nickname,
-            }
-            jwt_payload_refresh = {
-                "id": jsonable_encoder(user.id),
-                "nickname": user.nickname,
-                "role": jsonable_encoder(user.role),
-            }
+            user = await self.session.get(User, refresh_data["user_id"])
+            jwt_payload_refresh = refresh_claims(jsonable_encoder(user.id), user.nickname, user.first_name, user.email,
+                                                 user.avatar_filename, jsonable_encoder(user.role))
+            jwt_payload_access = access_claims(jwt_payload_refresh)
 
             access_token = create_access_token(jwt_payload_access)
             refresh_token = create_refresh_token(jwt_payload_refresh)
@@ -282,13 +361,16 @@ class UserRepository(AbstractUserRepository):
 
         return {"message": "Successfully redirected"}
 
-    async def log_out(self, resp: Response, refresh_data: dict | bool = Depends(get_refresh_token)):
+    async def log_out(self, resp: Response, request: Request,
+                      refresh_data: dict | bool = Depends(get_refresh_token)):
         if not refresh_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="You have to log in to log out =)"
             )
 
+        access_token_cache.evict(request.cookies.get("access_token"))
+        refresh_token_cache.evict(request.cookies.get("refresh_token"))
         try:
             resp.delete_cookie("access_token", path="/")
             resp.delete_cookie("refresh_token", path="/")
@@ -299,8 +381,12 @@ class UserRepository(AbstractUserRepository):
 
     async def delegate_rights_to_user(self, nickname: str):
         try:
-            await self.session.execute(update(User).filter(User.nickname == nickname).values(role="admin"))
+            user_ids = await self.session.execute(
+                update(User).filter(User.nickname == nickname).values(role="admin").returning(User.id))
+            user_ids = user_ids.scalars().all()
             await self.session.commit()
+            for user_id in user_ids:
+                role_cache.set(str(user_id), "admin")
             return {"status": f"user {nickname} is the admin now"}
         except Exception as e:
             await self.session.rollback()
@@ -308,17 +394,22 @@ class UserRepository(AbstractUserRepository):
 
     async def take_rights_from_user(self, nickname: str):
         try:
-            await self.session.execute(update(User).where(User.nickname == nickname).values(role="user"))
+            user_ids = await self.session.execute(
+                update(User).where(User.nickname == nickname).values(role="user").returning(User.id))
+            user_ids = user_ids.scalars().all()
             await self.session.commit()
+            for user_id in user_ids:
+                role_cache.set(str(user_id), "user")
         except Exception as e:
             await self.session.rollback()
             return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=e.__str__())
         return {"status": f"admin panel is taken from user {nickname}"}
 
+    @read_only
     async def count_ideas(self, access_data: dict | bool = Depends(get_access_token)):
         try:
-            res = await self.session.execute(select(Idea).filter(Idea.user_id == access_data["user_id"]))
-            ideas = res.scalars().all()
-            return len(ideas)
+            res = await self.session.execute(
+                select(func.count(Idea.idea_id)).filter(Idea.user_id == access_data["user_id"]))
+            return res.scalar_one()
         except Exception as e:
             return f"Error while counting ideas: {e}"
@@ -120,17 +120,6 @@ function displayErrors(errorData) {
 }
 
 async function getMain() {
-  const response = await fetch("/users/action", {
-    method: "POST",
-    headers: {
-      'Content-Type': 'application/json'
-    }
-  })
-  if (response.status == 200) {
-    window.location.href = "/";
-  } else {
-    window.location.href = "/";
-    alert("Sign in to continue")
-  }
+  window.location.href = "/";
 }
 
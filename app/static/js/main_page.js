@@ -23,25 +23,8 @@ async function toggleSidebar() {
 
 
 async function getProfile() {
-  try {
-    const response = await fetch("/users/action", {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      }
-    })
-    if (response.status == 200) {
-        data = await response.json()
-      alert(`Status: ${data.message}`)
-      window.location.href = "/profile";
-      return;
-    } else {
-      alert("sign up or sign in to continue")
-    }
-  } catch (e) {
-    console.error("Error", e)
-    alert("Something went wrong(")
-  }
+  // the server sends a visitor who isn't signed in on to the login form
+  window.location.href = "/profile";
 }
 
 async function getIdeasByDescr() {
@@ -55,7 +38,7 @@ async function getIdeasByDescr() {
   }
 
   try {
-    const response = await fetch(`/ideas/get_ideas_by_description/${description}`);
+    const response = await fetch(`/ideas/get_ideas_by_description/${encodeURIComponent(description)}`);
     if (response.status == 404) {
       alert("Sign in to continue")
       window.location.href = "/login";
@@ -70,8 +53,8 @@ async function getIdeasByDescr() {
     }
     const data = await response.json();
 
-
-    displayIdeas(data);
+    lastSearch = description;
+    displayIdeas(data.items);
   } catch (error) {
     console.error("Error fetching data:", error);
     alert("An error occurred while fetching data.");
@@ -79,7 +62,12 @@ async function getIdeasByDescr() {
 }
 
 
+// the ideas of the last search, kept current by the event stream below
+let shownIdeas = [];
+let lastSearch = "";
+
 async function displayIdeas(ideas) {
+  shownIdeas = ideas;
   const ideaBlock = document.getElementById("ideaBlock");
   ideaBlock.innerHTML = "";
   ideas.forEach(idea => {
@@ -94,19 +82,49 @@ async function displayIdeas(ideas) {
   });
 }
 
-async function createIdeaButton() {
-  try {
-    const response = await fetch("/users/action", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json"
-      }
-    })
-    if (response.status != 200) {
-      alert("Sign up or sign in to continue")
-      return;
+function matchesLastSearch(idea) {
+  const text = `${idea.title} ${idea.description}`.toLowerCase();
+  return lastSearch !== "" && lastSearch.toLowerCase().split(/\s+/).every(word => text.includes(word));
+}
+
+async function refreshLastSearch() {
+  if (!lastSearch) {
+    return;
+  }
+  const response = await fetch(`/ideas/get_ideas_by_description/${encodeURIComponent(lastSearch)}`);
+  displayIdeas(response.ok ? (await response.json()).items : []);
+}
+
+function followIdeas() {
+  // a logged out visitor gets 401, EventSource then gives up instead of reconnecting
+  const events = new EventSource("/ideas/stream");
+  events.addEventListener("created", e => {
+    const idea = JSON.parse(e.data);
+    if (matchesLastSearch(idea)) {
+      displayIdeas([idea, ...shownIdeas]);
     }
+  });
+  events.addEventListener("updated", e => {
+    const idea = JSON.parse(e.data);
+    if (shownIdeas.some(shown => shown.idea_id === idea.idea_id)) {
+      displayIdeas(shownIdeas.map(shown => shown.idea_id === idea.idea_id ? idea : shown));
+    }
+  });
+  events.addEventListener("deleted", e => {
+    const idea = JSON.parse(e.data);
+    displayIdeas(shownIdeas.filter(shown => shown.idea_id !== idea.idea_id));
+  });
+  events.addEventListener("cleared", () => displayIdeas([]));
+  // a bulk import only reports a count, the search is run again to pick up the new ideas
+  events.addEventListener("imported", () => refreshLastSearch());
+  // sent when this tab fell too far behind and missed events, the browser reconnects on its own
+  events.addEventListener("reset", () => refreshLastSearch());
+}
 
+followIdeas();
+
+async function createIdeaButton() {
+  try {
     const model = document.querySelectorAll(".ideas-background")[0];
     const closeButton = document.querySelectorAll(".close-button")[0];
     model.style.display = "block";
@@ -141,6 +159,10 @@ createButton.addEventListener("click", async () => {
       },
       body: JSON.stringify(ideaData),
     })
+    if (response.status == 401) {
+      alert("Sign up or sign in to continue");
+      return;
+    }
     if (!response.ok) {
       const errorData = await response.json();
       let errorMessage = `Error adding idea: ${response.status}`;
@@ -165,16 +187,6 @@ createButton.addEventListener("click", async () => {
 
 async function updateIdeaButton() {
   try {
-    const response = await fetch("/users/action", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json"
-      }
-    })
-    if (response.status != 200) {
-      alert("Sign up or sign in to continue")
-      return;
-    }
     const model = document.querySelectorAll(".ideas-background")[1];
     const closeButton = document.querySelectorAll(".close-button")[1];
     model.style.display = "block";
@@ -244,16 +256,6 @@ createButton2.addEventListener("click", async () => {
 
 async function deleteIdeaButton() {
   try {
-    const response = await fetch("users/action", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-    });
-    if (response.status != 200) {
-      alert("Sign up or sign in to continue")
-      return;
-    }
     const model = document.querySelectorAll(".ideas-background")[2];
     const closeButton = document.querySelectorAll(".close-button")[2];
     model.style.display = "block";
@@ -320,26 +322,22 @@ createButton3.addEventListener("click", async () => {
 
 async function forAdmins() {
   try {
-    const response = await fetch("users/action", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-    });
-    if (response.status != 200) {
-      alert("Sign up or sign in to continue")
-      return;
-    }
-    const rights = await fetch("ideas/all_ideas", {
+    const rights = await fetch("ideas/all_ideas?limit=50", {
       method: "GET",
       headers: {
         "Content-Type": "application/json"
       }
     })
+    if (rights.status == 404) {
+      alert("Sign up or sign in to continue")
+      return;
+    }
     if (rights.status == 403) {
       alert("You have no relevant rights")
       return;
     }
+    // the rights check doubles as the first page of the feed
+    let firstPage = await rights.json();
     const model = document.querySelectorAll(".ideas-background")[3];
     const closeButton = document.querySelectorAll(".close-button")[4];
     model.style.display = "block";
@@ -350,22 +348,33 @@ async function forAdmins() {
     getAllButton = document.querySelectorAll(".create-idea")[3];
 
 
-    getAllButton.addEventListener("click", async () => {
-      result4.innerHTML = ""
-      const response = await fetch("ideas/all_ideas", {
-        method: "GET",
-        headers: {
-          "Content-Type": "application/json"
+    let nextCursor = null;
+    getAllButton.onclick = async () => {
+      let data = firstPage;
+      firstPage = null;
+      if (!nextCursor) {
+        result4.innerHTML = ""
+      }
+      if (!data) {
+        let url = "ideas/all_ideas?limit=50";
+        if (nextCursor) {
+          url += `&after=${encodeURIComponent(nextCursor)}`;
         }
-      })
-      if (response.status == 403) {
-        alert("You have no relevant rights")
-        return;
+        const response = await fetch(url, {
+          method: "GET",
+          headers: {
+            "Content-Type": "application/json"
+          }
+        })
+        if (response.status == 403) {
+          alert("You have no relevant rights")
+          return;
+        }
+        data = await response.json()
       }
-      const data = await response.json()
       const ideasBlock = document.querySelectorAll(".ideas-background")[4];
       ideasBlock.style.display = "block";
-      data.forEach(idea => {
+      data.items.forEach(idea => {
         const ideaDiv = document.createElement("div")
         ideaDiv.classList.add("idea-block-style")
         ideaDiv.innerHTML =
@@ -376,8 +385,10 @@ async function forAdmins() {
     <p><strong>Author's nickname:</strong> ${idea.nickname}</p>`;
         result4.appendChild(ideaDiv)
       });
-
-    })
+      // the same button loads the next page until the feed is exhausted
+      nextCursor = data.next_cursor;
+      getAllButton.textContent = nextCursor ? "Load more ideas" : "Get all ideas";
+    }
   } catch (e) {
     console.error("Error", e)
     alert("something went wrong(")
@@ -33,7 +33,7 @@ function loadAvatar() {
     submitButton.style.display = "none";
     closeButton.style.display = "inline";
     const img = document.createElement('img');
-    img.src = `/users/avatar/${storedAvatar}`;
+    img.src = `/users/avatar/${storedAvatar}?size=256`;
     img.alt = "Uploaded Avatar";
     img.classList.add("avatar-class");
     userAva.appendChild(img);
@@ -73,7 +73,7 @@ uploadForm.addEventListener('submit', async (event) => {
       const data = await response.json();
 
     const img = document.createElement('img');
-        img.src = `/users/avatar/${data.filename}`;  // Adjust the path if needed
+        img.src = `/users/avatar/${data.filename}?size=256`;  // Adjust the path if needed
         img.alt = "Uploaded Avatar";
         img.classList.add("avatar-class")
         userAva.appendChild(img);
@@ -112,18 +112,39 @@ closeButton.addEventListener("click", async () => {
 })
 
 async function getMain() {
-  const response = await fetch("/users/action", {
+  window.location.href = "/";
+}
+
+async function deleteSelectedIdeas() {
+  const selected = [...document.querySelectorAll(".select-idea:checked")];
+  if (selected.length === 0) {
+    alert("Select the ideas to delete");
+    return;
+  }
+  // all the selected ideas go in one request and one transaction
+  const response = await fetch("/ideas/batch", {
     method: "POST",
     headers: {
-      'Content-Type': 'application/json'
-    }
-  })
-  if (response.status == 200) {
-    window.location.href = "/";
-  } else {
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify({operations: selected.map(box => ({op: "delete", title: box.dataset.title}))}),
+  });
+  if (response.status === 401) {
     window.location.href = "/";
-    alert("Sign in to continue")
+    return;
   }
+  if (!response.ok) {
+    alert("Что-то пошло не так(");
+    return;
+  }
+  const data = await response.json();
+  const deleted = new Set(data.results.filter(item => item.status === "deleted").map(item => item.title));
+  selected.forEach(box => {
+    if (deleted.has(box.dataset.title)) {
+      box.closest(".idea-block-style").remove();
+    }
+  });
+  alert(`Deleted: ${data.deleted}`);
 }
 
 async function GetMyIdeas() {
@@ -135,20 +156,6 @@ async function GetMyIdeas() {
   }
 
   try {
-    const response = await fetch("/users/action", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json"
-      },
-    });
-
-    if (response.status === 401) {
-      window.location.href = "/";
-      console.error("время ожидания истекло");
-      alert("время ожидания истекло. Пожалуйста, войдите в систему для продолжения");
-      return;
-    }
-
     const result = document.querySelector(".result");
     result.innerHTML = "";
     ideasBackground.style.display = "block";
@@ -187,12 +194,14 @@ async function GetMyIdeas() {
       const ideaDiv = document.createElement("div");
       ideaDiv.classList.add("idea-block-style");
       ideaDiv.innerHTML =
-        `<p><strong>Title:</strong> ${idea.title}</p>
+        `<p><input type="checkbox" class="select-idea"> <strong>Title:</strong> ${idea.title}</p>
          <p><strong>Description:</strong> ${idea.description}</p>
          <p><strong>Time of creation:</strong> ${idea.created_at}</p>
          <p><strong>Author's nickname:</strong> ${idea.nickname}</p>`;
+      ideaDiv.querySelector(".select-idea").dataset.title = idea.title;
       result.appendChild(ideaDiv);
     });
+    document.querySelector(".delete-selected").onclick = deleteSelectedIdeas;
 
   } catch (e) {
     console.error("Error", e)
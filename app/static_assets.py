@@ -0,0 +1,142 @@
+"""Fingerprinted, precompressed static files.
+
+The build copies app/static into app/static_build under content-hashed names next to the
+original ones, with .br/.gz siblings for text assets, and writes a manifest of the hashed names:
+
+    python -m app.static_assets
+
+Without a build the files are served from app/static as they are."""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import brotli
+from jinja2 import pass_context
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.templating import Jinja2Templates
+from starlette.types import Scope
+
+from app.http_cache import pick_encoding
+
+SOURCE_DIR = "app/static"
+BUILD_DIR = "app/static_build"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".js", ".css", ".svg", ".html", ".json", ".txt")
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# names without a hash may get new content at any deploy
+REVALIDATE_CACHE_CONTROL = "no-cache"
+CSS_URL = re.compile(r"""url\((['"]?)([^)'"]+)\1\)""")
+
+
+def fingerprint(path: str, content: bytes) -> str:
+    stem, extension = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+
+
+def rewrite_css(path: str, content: bytes, manifest: dict[str, str]) -> bytes:
+    """Points relative url() references at the hashed names, so a new image also changes the stylesheet hash."""
+    base = posixpath.dirname(path)
+
+    def replace(match: re.Match) -> str:
+        quote, url = match.groups()
+        hashed = manifest.get(posixpath.normpath(posixpath.join(base, url)))
+        if hashed is None or "://" in url or url.startswith(("data:", "/", "#")):
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(hashed, base)}{quote})"
+
+    return CSS_URL.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+def write_asset(target: str, path: str, content: bytes):
+    full_path = os.path.join(target, *path.split("/"))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(content)
+    if not path.endswith(COMPRESSIBLE):
+        return
+    for suffix, compressed in ((".br", brotli.compress(content, quality=11)),
+                               (".gz", gzip.compress(content, compresslevel=9, mtime=0))):
+        if len(compressed) < len(content):
+            with open(full_path + suffix, "wb") as f:
+                f.write(compressed)
+
+
+def build(source: str = SOURCE_DIR, target: str = BUILD_DIR) -> dict[str, str]:
+    paths = [posixpath.join(*os.path.relpath(os.path.join(root, name), source).split(os.sep))
+             for root, _, names in os.walk(source) for name in names]
+    # stylesheets go last, by then the hashed names of the images they use are known
+    paths.sort(key=lambda path: (path.endswith(".css"), path))
+    manifest: dict[str, str] = {}
+    shutil.rmtree(target, ignore_errors=True)
+    for path in paths:
+        with open(os.path.join(source, *path.split("/")), "rb") as f:
+            content = f.read()
+        if path.endswith(".css"):
+            content = rewrite_css(path, content, manifest)
+        manifest[path] = fingerprint(path, content)
+        write_asset(target, path, content)
+        write_asset(target, manifest[path], content)
+    with open(os.path.join(target, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticAssets(StaticFiles):
+    """Serves the build when there is one: precompressed siblings by Accept-Encoding, hashed names as immutable."""
+
+    def __init__(self, source: str = SOURCE_DIR, build_dir: str = BUILD_DIR):
+        manifest_path = os.path.join(build_dir, MANIFEST)
+        self.manifest: dict[str, str] = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self.fingerprinted = set(self.manifest.values())
+        super().__init__(directory=build_dir if self.manifest else source)
+
+    def resolve(self, path: str) -> str:
+        return self.manifest.get(path, path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        path = posixpath.join(*os.path.relpath(full_path, os.path.realpath(self.directory)).split(os.sep))
+        response = None
+        encoding = pick_encoding(request_headers.get("accept-encoding"))
+        if encoding is not None and os.path.exists(str(full_path) + ENCODINGS[encoding]):
+            compressed = str(full_path) + ENCODINGS[encoding]
+            response = FileResponse(compressed, status_code=status_code, stat_result=os.stat(compressed),
+                                    media_type=mimetypes.guess_type(str(full_path))[0] or "text/plain",
+                                    headers={"Content-Encoding": encoding})
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if path.endswith(COMPRESSIBLE):
+            response.headers.add_vary_header("Accept-Encoding")
+        response.headers["Cache-Control"] = (IMMUTABLE_CACHE_CONTROL if path in self.fingerprinted
+                                             else REVALIDATE_CACHE_CONTROL)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def use_fingerprinted_urls(templates: Jinja2Templates, assets: StaticAssets):
+    """url_for('static', path=...) in the templates gives the hashed name of the asset."""
+
+    @pass_context
+    def url_for(context: dict, name: str, /, **path_params) -> str:
+        if name == "static" and "path" in path_params:
+            path_params["path"] = assets.resolve(path_params["path"])
+        return str(context["request"].app.url_path_for(name, **path_params))
+
+    templates.env.globals["url_for"] = url_for
+
+
+if __name__ == "__main__":
+    for source_path, hashed_path in build().items():
+        print(f"{source_path} -> {hashed_path}")
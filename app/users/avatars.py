@@ -0,0 +1,204 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette import status
+
+from app.database.config import async_session_maker
+from app.database.models import User
+
+CHUNK_SIZE = 64 * 1024
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_AVATAR_BYTES = 10 * 1024 * 1024
+# the multipart body around the file: boundaries, part headers, the file name
+MULTIPART_OVERHEAD = 64 * 1024
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+}
+
+
+class AvatarTooLarge(Exception):
+    pass
+
+
+def receive_avatar(source: BinaryIO, folder: str, extension: str, max_bytes: int = MAX_AVATAR_BYTES) -> tuple[str, str]:
+    """Copies the upload chunk by chunk into a temp file while hashing it. Blocking, meant to run in a thread.
+    Returns the temp path and the content-addressed name <sha256>.<ext>, place_avatar moves it there."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AvatarTooLarge()
+                digest.update(chunk)
+                tmp.write(chunk)
+        return tmp_path, f"{digest.hexdigest()}.{extension}"
+    except BaseException:
+        discard_upload(tmp_path)
+        raise
+
+
+def place_avatar(folder: str, tmp_path: str, filename: str):
+    """An avatar that is already on disk is not written twice. Called under the avatar lock,
+    so a concurrent collection cannot delete the file between this and the commit."""
+    path = os.path.join(folder, filename)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def discard_upload(tmp_path: str):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def avatar_lock(filename: str):
+    """Transaction-scoped advisory lock serializing the upload and the collection of one file."""
+    return select(func.pg_advisory_xact_lock(func.hashtext(f"avatar:{filename}")))
+
+
+def delete_avatar_file(folder: str, filename: str):
+    path = os.path.join(folder, os.path.basename(filename))
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def media_type_for(filename: str) -> str:
+    # files uploaded before content addressing have no dot before the extension
+    for content_type, extension in EXTENSIONS.items():
+        if filename.endswith(extension):
+            return content_type
+    return "application/octet-stream"
+
+
+class AvatarMemoryCache:
+    """LRU of small avatar bodies, bounded by total size. Safe without invalidation on upload
+    because a file name never gets different content, only deletion has to evict."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_item_bytes: int = 256 * 1024):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.size = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, filename: str) -> bytes | None:
+        content = self._items.get(filename)
+        if content is not None:
+            self._items.move_to_end(filename)
+        return content
+
+    def put(self, filename: str, content: bytes):
+        if len(content) > self.max_item_bytes:
+            return
+        self.evict(filename)
+        self._items[filename] = content
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def evict(self, filename: str):
+        content = self._items.pop(filename, None)
+        if content is not None:
+            self.size -= len(content)
+
+
+class AvatarOwners:
+    """filename -> ids of the users whose avatar it is, so serving an avatar needs no query."""
+
+    def __init__(self):
+        self._owners: dict[str, set[str]] = {}
+
+    def has_owner(self, filename: str) -> bool:
+        return bool(self._owners.get(filename))
+
+    def add(self, filename: str, user_id: str):
+        if filename and filename != "none":
+            self._owners.setdefault(filename, set()).add(user_id)
+
+    def forget(self, filename: str):
+        self._owners.pop(filename, None)
+
+    def discard(self, filename: str | None, user_id: str):
+        owners = self._owners.get(filename)
+        if owners is not None:
+            owners.discard(user_id)
+            if not owners:
+                del self._owners[filename]
+
+
+avatar_cache = AvatarMemoryCache()
+avatar_owners = AvatarOwners()
+
+
+def stat_or_none(path: str) -> os.stat_result | None:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def read_avatar(path: str, stat_result: os.stat_result) -> bytes | None:
+    """The content if the file is small enough for the memory tier, None to stream it from disk."""
+    if stat_result.st_size > avatar_cache.max_item_bytes:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def warm_avatar_owners():
+    async with async_session_maker() as session:
+        result = await session.stream(
+            select(User.avatar_filename, User.id).filter(User.avatar_filename.is_not(None),
+                                                         User.avatar_filename != "none"))
+        async for filename, user_id in result:
+            avatar_owners.add(filename, str(user_id))
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects an avatar upload larger than the limit before Starlette spools it to disk.
+
+    A declared Content-Length is checked up front, a chunked body is counted as it is received."""
+
+    def __init__(self, app: ASGIApp, path: str, max_bytes: int = MAX_AVATAR_BYTES + MULTIPART_OVERHEAD):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": "File too large"}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # re-raised by FastAPI's body parsing as is
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
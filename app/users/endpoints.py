@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, UploadFile, Query
 
 from starlette import status
 
@@ -7,7 +7,7 @@ from starlette.responses import Response
 
 from app.auth.utils import get_access_token, get_refresh_token
 from app.repositories.user_repository import get_user_repository, UserRepository
-from app.users.schemas import UserCreate, UserLogin
+from app.users.schemas import UserCreate, UserLogin, UserOut
 user_router = APIRouter(prefix="/users", tags=["USERS"])
 
 
@@ -34,16 +34,17 @@ async def get_me(response: Response, session: UserRepository = Depends(get_user_
 
 
 @user_router.post("/logout")
-async def sign_out(resp: Response,  refresh_data: dict | bool = Depends(get_refresh_token), session: UserRepository = Depends(get_user_repository)):
-    return await session.log_out(resp, refresh_data)
+async def sign_out(resp: Response, request: Request, refresh_data: dict | bool = Depends(get_refresh_token), session: UserRepository = Depends(get_user_repository)):
+    return await session.log_out(resp, request, refresh_data)
 
 @user_router.post("/upload_ava", status_code=status.HTTP_201_CREATED)
 async def upload_ava(file: UploadFile, access_data: bool | dict = Depends(get_access_token), session: UserRepository = Depends(get_user_repository)):
     return await session.create_upload_file(file, access_data)
 
 @user_router.get("/avatar/{filename}")
-async def get_avatar(filename: str, session: UserRepository = Depends(get_user_repository)):
-    return await session.serve_avatar(filename)
+async def get_avatar(filename: str, request: Request, size: int | None = Query(None, ge=1, le=1024),
+                     session: UserRepository = Depends(get_user_repository)):
+    return await session.serve_avatar(filename, request, size)
 
 @user_router.get("/give_rights/{nickname}")
 async def give_rights(nickname: str, session: UserRepository = Depends(get_user_repository)):
@@ -54,7 +55,7 @@ async def give_rights(nickname: str, session: UserRepository = Depends(get_user_
 async def take_rights(nickname: str, session: UserRepository = Depends(get_user_repository)):
     return await session.take_rights_from_user(nickname)
 
-@user_router.get("/current_user")
+@user_router.get("/current_user", response_model=UserOut)
 async def current_user(session: UserRepository = Depends(get_user_repository), access_data: dict | bool = Depends(get_access_token)):
     return await session.get_user_by_id(access_data)
 
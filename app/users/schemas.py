@@ -10,6 +10,20 @@ class UserRole(Enum):
     ADMIN = "admin"
     MODER = "moder"
 
+class UserOut(BaseModel):
+    """What the API shows of a user, the password hash never leaves the repository."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: uuid.UUID
+    nickname: str
+    first_name: str
+    last_name: str
+    email: str
+    role: str
+    avatar_filename: str | None = None
+    created_at: datetime
+
+
 class UserBase(BaseModel):
     id: str = "123"
     first_name: str
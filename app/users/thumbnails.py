@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from app.database.config import settings
+
+VARIANT_SIZES = (64, 128, 256)
+VARIANT_FORMAT = "webp"
+VARIANT_MEDIA_TYPE = "image/webp"
+VARIANTS_FOLDER = "variants"
+
+logger = logging.getLogger("my_app.thumbnails")
+
+
+def variant_filename(filename: str, size: int) -> str:
+    return f"{filename}_{size}.{VARIANT_FORMAT}"
+
+
+def variant_path(folder: str, filename: str, size: int) -> str:
+    return os.path.join(folder, VARIANTS_FOLDER, variant_filename(filename, size))
+
+
+def pick_variant_size(requested: int) -> int:
+    """The smallest variant that is at least as large as requested, so the client never upscales."""
+    for size in VARIANT_SIZES:
+        if size >= requested:
+            return size
+    return VARIANT_SIZES[-1]
+
+
+def make_variants(folder: str, filename: str):
+    """Runs in a worker process: decodes the original once and writes every size next to it."""
+    os.makedirs(os.path.join(folder, VARIANTS_FOLDER), exist_ok=True)
+    with Image.open(os.path.join(folder, filename)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for size in sorted(VARIANT_SIZES, reverse=True):
+            image = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+            path = variant_path(folder, filename, size)
+            # written under a temporary name, a half-written variant must never be served
+            image.save(path + ".tmp", format=VARIANT_FORMAT, quality=80, method=4)
+            os.replace(path + ".tmp", path)
+
+
+def delete_variants(folder: str, filename: str):
+    for size in VARIANT_SIZES:
+        try:
+            os.remove(variant_path(folder, filename, size))
+        except FileNotFoundError:
+            pass
+
+
+class ThumbnailPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending: set[asyncio.Future] = set()
+
+    def start(self):
+        """Called from the lifespan, not from the first upload in the middle of a request."""
+        if self._executor is None:
+            # forked from the forkserver rather than from this process, a server worker runs threads
+            self._executor = ProcessPoolExecutor(max_workers=self.size,
+                                                 mp_context=multiprocessing.get_context("forkserver"))
+
+    def schedule(self, folder: str, filename: str):
+        self.start()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, make_variants, folder, filename)
+        self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future: asyncio.Future):
+        self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Avatar variants failed: {future.exception()!r}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+thumbnail_pool = ThumbnailPool(settings.THUMBNAIL_POOL_SIZE)
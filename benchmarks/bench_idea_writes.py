@@ -0,0 +1,104 @@
+"""Round-trips and latency of the idea write paths: select-then-mutate (the old code) vs single statements.
+
+Runs against the database from .env as a throwaway user that is removed afterwards.
+
+    python -m benchmarks.bench_idea_writes
+"""
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import select, delete, update, insert, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.database.config import async_session_maker
+from app.database.instrumentation import start_query_tracking
+from app.database.models import Idea, IdeaTombstone, User
+
+ROUNDS = 300
+
+
+async def old_add(session, user_id, title):
+    existing = await session.execute(select(Idea).filter(Idea.title == title))
+    if existing.scalar_one_or_none():
+        return
+    idea = Idea(title=title, description="bench", created_at="bench", user_id=user_id, nickname="bench")
+    session.add(idea)
+    await session.commit()
+    await session.refresh(idea)
+
+
+async def new_add(session, user_id, title):
+    await session.execute(
+        pg_insert(Idea).values(title=title, description="bench", created_at="bench", user_id=user_id,
+                               nickname="bench")
+        .on_conflict_do_nothing(index_elements=[Idea.title]).returning(Idea.idea_id, Idea.updated_at))
+    await session.commit()
+
+
+async def old_update(session, user_id, title):
+    idea = (await session.execute(select(Idea).filter(Idea.user_id == user_id, Idea.title == title))).scalar_one()
+    idea.description = "bench updated"
+    idea.updated_at = func.now()
+    await session.commit()
+
+
+async def new_update(session, user_id, title):
+    await session.execute(update(Idea).where(Idea.user_id == user_id, Idea.title == title)
+                          .values(description="bench updated", updated_at=func.now()).returning(Idea.idea_id))
+    await session.commit()
+
+
+async def old_delete(session, user_id, title):
+    idea = (await session.execute(select(Idea).filter(Idea.user_id == user_id, Idea.title == title))).scalar_one()
+    session.add(IdeaTombstone(idea_id=idea.idea_id, title=idea.title, user_id=idea.user_id))
+    await session.delete(idea)
+    await session.commit()
+
+
+async def new_delete(session, user_id, title):
+    deleted = (delete(Idea).where(Idea.user_id == user_id, Idea.title == title)
+               .returning(Idea.idea_id, Idea.title, Idea.user_id).cte("deleted"))
+    await session.execute(insert(IdeaTombstone).from_select(
+        ["idea_id", "title", "user_id"], select(deleted.c.idea_id, deleted.c.title, deleted.c.user_id)))
+    await session.commit()
+
+
+PATHS = {"old": (old_add, old_update, old_delete), "new": (new_add, new_update, new_delete)}
+
+
+async def measure(name: str, write, user_id, prefix: str):
+    latencies, statements = [], 0
+    async with async_session_maker() as session:
+        for i in range(ROUNDS):
+            stats = start_query_tracking()
+            start = time.perf_counter()
+            await write(session, user_id, f"{prefix}-{i}")
+            latencies.append(time.perf_counter() - start)
+            statements += stats.count
+    latencies.sort()
+    # every path ends with one COMMIT, which the cursor hooks don't see
+    print(f"{name:>12}: {statements / ROUNDS + 1:.1f} round-trips, p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+
+
+async def main():
+    user_id = uuid.uuid4()
+    async with async_session_maker() as session:
+        session.add(User(id=user_id, nickname=f"bench-{user_id}", first_name="bench", last_name="bench",
+                         email=f"{user_id}@bench.invalid", password="-"))
+        await session.commit()
+    try:
+        for label, paths in PATHS.items():
+            for operation, write in zip(("add", "update", "delete"), paths):
+                await measure(f"{label} {operation}", write, user_id, f"bench-{label}-{user_id}")
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(IdeaTombstone).where(IdeaTombstone.user_id == user_id))
+            await session.execute(delete(Idea).where(Idea.user_id == user_id))
+            await session.execute(delete(User).where(User.id == user_id))
+            await session.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""Event-loop responsiveness while CONCURRENT_LOGINS bcrypt checks run inline vs in the password pool.
+
+    python -m benchmarks.bench_password_pool
+"""
+import asyncio
+import time
+
+from app.auth.password_pool import PasswordPool
+from app.auth.utils import hash_password, verify_password
+
+CONCURRENT_LOGINS = 32
+TICK = 0.005
+
+
+async def measure_lag(stop: asyncio.Event, lags: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def inline_verify(password: str, hashed: str):
+    return verify_password(password, hashed)
+
+
+async def run(name: str, verify):
+    hashed = hash_password("Password1")
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(verify("Password1", hashed) for _ in range(CONCURRENT_LOGINS)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    lags.sort()
+    print(f"{name:>8}: total {elapsed:.2f}s, loop lag max {lags[-1] * 1000:.1f} ms, "
+          f"p99 {lags[int(len(lags) * 0.99) - 1] * 1000:.1f} ms")
+
+
+async def main():
+    pool = PasswordPool(size=0, queue_limit=CONCURRENT_LOGINS)
+    await run("inline", inline_verify)
+    await run("pool", lambda password, hashed: pool.run(verify_password, password, hashed))
+    stats = pool.stats
+    print(f"pool: avg hash {stats.hash_seconds_total / stats.completed * 1000:.1f} ms, "
+          f"avg queue wait {stats.queue_wait_seconds_total / stats.completed * 1000:.1f} ms")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""Throughput of CONCURRENCY simulated requests against the database from .env as the pool size varies.
+
+Each request checks a connection out and runs the first page of the idea listing. The wait column is
+the time spent queueing for a connection, which is what a too small pool adds to every request.
+
+    python -m benchmarks.bench_pool
+"""
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database.config import settings
+from app.database.models import Idea
+
+POOL_SIZES = (1, 2, 5, 10, 20, 40)
+CONCURRENCY = 64
+DURATION = 5.0
+QUERY = select(Idea.idea_id, Idea.title, Idea.updated_at).order_by(Idea.updated_at.desc(), Idea.idea_id).limit(20)
+
+
+async def client(engine, deadline: float, latencies: list[float], waits: list[float]):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with engine.connect() as connection:
+            waits.append(time.perf_counter() - start)
+            (await connection.execute(QUERY)).all()
+        latencies.append(time.perf_counter() - start)
+
+
+async def measure(pool_size: int):
+    engine = create_async_engine(
+        settings.DB_URL, pool_size=pool_size, max_overflow=0, pool_timeout=DURATION * 2,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE})
+    try:
+        # connections are opened up front so that connect time is not counted as throughput
+        async def open_connection():
+            async with engine.connect() as connection:
+                await connection.execute(QUERY)
+
+        await asyncio.gather(*(open_connection() for _ in range(pool_size)))
+        latencies, waits = [], []
+        deadline = time.perf_counter() + DURATION
+        await asyncio.gather(*(client(engine, deadline, latencies, waits) for _ in range(CONCURRENCY)))
+    finally:
+        await engine.dispose()
+    latencies.sort()
+    print(f"pool {pool_size:>3}: {len(latencies) / DURATION:8.0f} req/s, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:6.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} ms, "
+          f"mean wait {sum(waits) / len(waits) * 1000:6.2f} ms")
+
+
+async def main():
+    print(f"{CONCURRENCY} concurrent clients, {DURATION:.0f} s per pool size")
+    for pool_size in POOL_SIZES:
+        await measure(pool_size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""Search latency against corpus size for the in-process index.
+
+    python -m benchmarks.bench_search
+"""
+import random
+import statistics
+import string
+import time
+
+from app.ideas.inverted_index import InvertedIndex
+
+CORPUS_SIZES = (1_000, 10_000, 100_000)
+QUERIES = 200
+VOCABULARY = ["".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9))) for _ in range(20_000)]
+
+
+def make_idea(idea_id: int) -> dict:
+    return {"idea_id": idea_id,
+            "title": " ".join(random.choices(VOCABULARY, k=4)),
+            "description": " ".join(random.choices(VOCABULARY, k=40))}
+
+
+def main():
+    random.seed(0)
+    print(f"{'ideas':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in CORPUS_SIZES:
+        index = InvertedIndex()
+        for idea_id in range(size):
+            index.add(**make_idea(idea_id))
+        queries = [" ".join(w[:random.randint(2, len(w))] for w in random.choices(VOCABULARY, k=random.randint(1, 2)))
+                   for _ in range(QUERIES)]
+        index.search("warmup")
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"{size:>8} {statistics.median(timings):>8.3f} {timings[int(len(timings) * 0.99) - 1]:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""CPU spent serializing a 10k-idea response: jsonable_encoder over ORM objects (the old path)
+vs a column select rendered by the response models or by orjson.
+
+    python -m benchmarks.bench_serialization
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.database.models import Idea
+from app.ideas.schemas import IdeaList
+
+IDEAS = 10_000
+REPEATS = 10
+
+
+def make_rows() -> list[dict]:
+    user_id = uuid.uuid4()
+    now = datetime.now(tz=timezone.utc)
+    return [{"idea_id": idea_id, "title": f"idea {idea_id}", "description": "some description " * 8,
+             "created_at": "2026-10-18 12:00:00", "updated_at": now, "user_id": user_id, "nickname": "bench"}
+            for idea_id in range(IDEAS)]
+
+
+def measure(name: str, render, payload):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        body = render(payload)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    print(f"{name:>28}: {elapsed * 1000:8.1f} ms per response, {len(body) / 1024:.0f} KiB")
+
+
+def main():
+    rows = make_rows()
+    orm_objects = [Idea(**row) for row in rows]
+    measure("jsonable_encoder(ORM) + json", lambda ideas: json.dumps(jsonable_encoder(ideas)).encode(), orm_objects)
+    measure("jsonable_encoder(rows) + json", lambda ideas: json.dumps(jsonable_encoder(ideas)).encode(), rows)
+    measure("response model dump_json", lambda ideas: IdeaList.dump_json(IdeaList.validate_python(ideas)), rows)
+    measure("orjson(rows)", orjson.dumps, rows)
+
+
+if __name__ == "__main__":
+    main()
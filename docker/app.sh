@@ -3,5 +3,6 @@
 #alembic upgrade head
 
 
-uvicorn main:app --host 0.0.0.0 --port 8000 --reload
+# exec: the server gets SIGTERM from docker stop directly and drains its workers
+exec python serve.py
 
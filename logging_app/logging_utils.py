@@ -1,50 +1,173 @@
 
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
 
 from starlette import status
+from starlette.requests import Request
 from starlette.responses import JSONResponse
 
+LOGGER_NAME = "my_app"
+RECORD_FIELDS = ("method", "route", "url", "status", "duration_ms")
 
-def get_logger():
-    """Создаёт и настраивает логгер."""
-    logger = logging.getLogger("my_app")
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна JSON-строка с полями запроса."""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SuccessSamplingFilter(logging.Filter):
+    """Пропускает только долю записей об успешных (2xx) ответах, ошибки пишутся всегда."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        response_status = getattr(record, "status", None)
+        if response_status is None or not 200 <= response_status < 300 or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class RecordQueueHandler(QueueHandler):
+    """QueueHandler.prepare вклеивает трейсбек в message и убирает exc_info, и JsonFormatter не видел бы
+    исключения. Здесь в очередь уходит копия записи с подставленными args, а exc_info форматируют
+    обработчики в потоке QueueListener."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # args могут измениться, пока запись ждёт в очереди
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def get_logger(json_format: bool = False, filename: str = "app.log", max_bytes: int = 10 * 1024 * 1024,
+               backup_count: int = 5, success_sample_rate: float = 1.0):
+    """Создаёт и настраивает логгер.
+
+    Запись в файл и stdout идёт в фоновом потоке QueueListener, в event loop остаётся только
+    постановка записи в очередь. Повторный вызов возвращает уже настроенный логгер."""
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
     logger.setLevel(logging.INFO)  # Устанавливает уровень логов
+    logger.propagate = False
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s - %(name)s"
-    )
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(levelname)s - %(message)s - %(name)s"
+        )
 
     stream_handler = logging.StreamHandler(stream=sys.stdout)
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
 
-
-    # Логгирование в файл (важно для производства)
-    file_handler = logging.FileHandler("app.log")
+    # Логгирование в файл (важно для производства), с ротацией по размеру
+    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
+    log_queue = queue.SimpleQueue()
+    queue_handler = RecordQueueHandler(log_queue)
+    queue_handler.addFilter(SuccessSamplingFilter(success_sample_rate))
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
     return logger
 
 
-def log_exception(logger, request_info, exc_info=None):
+def _restart_after_fork():
+    """Дочерний процесс (воркер после preload) наследует очередь, но не поток QueueListener."""
+    if _listener is not None:
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def share_log_file():
+    """Для нескольких процессов, пишущих в один файл (воркеры serve.py).
+
+    RotatingFileHandler каждого процесса переименовывал бы файл из-под остальных, поэтому ротация
+    по размеру отключается: WatchedFileHandler только дописывает строки и переоткрывает файл,
+    когда его сменил внешний logrotate."""
+    global _listener
+    if _listener is None:
+        return
+    handlers = []
+    for handler in _listener.handlers:
+        if isinstance(handler, RotatingFileHandler):
+            shared = WatchedFileHandler(handler.baseFilename, encoding="utf-8")
+            shared.setFormatter(handler.formatter)
+            handler.close()
+            handler = shared
+        handlers.append(handler)
+    log_queue = _listener.queue
+    _listener.stop()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def route_template(request: Request) -> str:
+    """Шаблон пути (/ideas/delete_idea/{title}) вместо сырого URL, чтобы не плодить метки."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def log_exception(logger, request_info, exc_info=None, **fields):
   """Логирует исключения с контекстом запроса."""
   if exc_info:
-    logger.exception(f"Error: {request_info}")
+    logger.exception(f"Error: {request_info}", extra=fields)
   else:
-    logger.error(f"Error: {request_info}")
+    logger.error(f"Error: {request_info}", extra=fields)
 
 
 def log_request(logger, request_info):
     logger.info(f"Request: {request_info}")
 
 
-def log_response(logger, response_status, response_info):
-    logger.info(f"Response: {response_status} Additional Info: {response_info}")
+def log_response(logger, response_status, response_info, **fields):
+    logger.info(f"Response: {response_status} Additional Info: {response_info}",
+                extra={"status": response_status, **fields})
 
 
-def log_and_return_error_response(logger, request_info, exc_info=None, error_status_code=status.HTTP_500_INTERNAL_SERVER_ERROR):
+def log_and_return_error_response(logger, request_info, exc_info=None, error_status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                  **fields):
   """Логирует ошибку и возвращает JSONResponse с ошибкой."""
-  log_exception(logger, request_info, exc_info)
-  return JSONResponse(status_code=error_status_code, content={"detail": "Ошибка сервера"})
\ No newline at end of file
+  log_exception(logger, request_info, exc_info, status=error_status_code, **fields)
+  return JSONResponse(status_code=error_status_code, content={"detail": "Ошибка сервера"})
@@ -0,0 +1,179 @@
+import asyncio
+import glob
+import json
+import os
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "http_requests_total": ("counter", "Requests by route, method and status class."),
+    "http_request_duration_seconds": ("histogram", "Request latency by route and method."),
+    "http_requests_in_flight": ("gauge", "Requests being processed right now."),
+    "password_hash_seconds": ("histogram", "Time a bcrypt job spends in a worker process."),
+    "password_queue_wait_seconds": ("histogram", "Time a bcrypt job waits for a free worker process."),
+    "password_rejected_total": ("counter", "Bcrypt jobs rejected because the pool queue was full."),
+    "idea_cache_requests_total": ("counter", "Idea listing cache lookups by result (hit/miss)."),
+    "idea_event_subscribers": ("gauge", "Open SSE connections to the idea event stream."),
+    "idea_events_dropped_total": ("counter", "SSE subscribers dropped for falling behind the event stream."),
+    "db_pool_size": ("gauge", "Connections the database pool keeps open."),
+    "db_pool_in_use": ("gauge", "Database connections checked out of the pool."),
+    "db_pool_overflow": ("gauge", "Database connections open beyond the pool size."),
+    "db_pool_checkout_seconds": ("histogram", "Time a request waits for a database connection."),
+    "db_pool_timeouts_total": ("counter", "Checkouts that gave up after DB_POOL_TIMEOUT seconds."),
+}
+
+
+class Metrics:
+    """Per-process counters, gauges and histograms.
+
+    With several workers every process dumps its snapshot to <directory>/<pid>.json and
+    /metrics sums all of them. Counters and histograms of workers that have exited are kept,
+    gauges only count live processes."""
+
+    def __init__(self):
+        self.directory: str | None = None
+        self.counters: dict[tuple, float] = defaultdict(float)
+        self.gauges: dict[tuple, float] = defaultdict(float)
+        self.histograms: dict[tuple, list] = {}
+
+    def configure(self, directory: str | None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, *sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[self._key(name, labels)] += value
+
+    def add_gauge(self, name: str, value: float, **labels):
+        self.gauges[self._key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # counts per bucket (+Inf last), sum, count
+            histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0, list(buckets)]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "counters": [[list(key), value] for key, value in self.counters.items()],
+            "gauges": [[list(key), value] for key, value in self.gauges.items()],
+            "histograms": [[list(key), [list(h[0]), h[1], h[2], h[3]]] for key, h in self.histograms.items()],
+        }
+
+    def _write(self, snapshot: dict):
+        path = os.path.join(self.directory, f"{snapshot['pid']}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+
+    async def flush(self):
+        if self.directory:
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    async def run_flusher(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def _snapshots(self) -> list[dict]:
+        if not self.directory:
+            return [self.snapshot()]
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _collect(self) -> tuple[dict, dict, dict]:
+        counters, gauges, histograms = defaultdict(float), defaultdict(float), {}
+        for snapshot in self._snapshots():
+            for key, value in snapshot["counters"]:
+                counters[_to_key(key)] += value
+            if snapshot["pid"] == os.getpid() or self._alive(snapshot["pid"]):
+                for key, value in snapshot["gauges"]:
+                    gauges[_to_key(key)] += value
+            for key, (buckets, total, count, bounds) in snapshot["histograms"]:
+                key = _to_key(key)
+                merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0, bounds])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+        return counters, gauges, histograms
+
+    def render(self) -> str:
+        counters, gauges, histograms = self._collect()
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described and name in HELP:
+                kind, text = HELP[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for key in sorted(counters):
+            describe(key[0])
+            lines.append(f"{key[0]}{_labels(key[1:])} {counters[key]}")
+        for key in sorted(gauges):
+            describe(key[0])
+            lines.append(f"{key[0]}{_labels(key[1:])} {gauges[key]}")
+        for key in sorted(histograms):
+            name, labels = key[0], key[1:]
+            buckets, total, count, bounds = histograms[key]
+            describe(name)
+            cumulative = 0
+            for bound, bucket in zip([*bounds, "+Inf"], buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels((*labels, ('le', str(bound))))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _to_key(raw: list) -> tuple:
+    return (raw[0], *(tuple(label) for label in raw[1:]))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def record_request(method: str, route: str, status_code: int, duration: float):
+    metrics.inc("http_requests_total", method=method, route=route, status=f"{status_code // 100}xx")
+    metrics.observe("http_request_duration_seconds", duration, method=method, route=route)
+
+
+metrics = Metrics()
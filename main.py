@@ -1,36 +1,80 @@
+import asyncio
+import os
 import secrets
+import time
 from contextlib import asynccontextmanager
 
 
 from fastapi import FastAPI, Depends
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
-from fastapi.staticfiles import StaticFiles
+from starlette.responses import PlainTextResponse, RedirectResponse
 from starlette.templating import Jinja2Templates
 
 from uvicorn import run
 
+from app.auth.middleware import TokenRefreshMiddleware
+from app.auth.password_pool import password_pool
+from app.compression import CompressionMiddleware
 from app.auth.utils import get_access_token
-from app.database.config import settings
+from app.database.config import settings, engine, read_engine, warm_up_pool
+from app.database.routing import ReplicaStickinessMiddleware
+from app.database.instrumentation import start_query_tracking
 from app.ideas.endpoints import idea_router
+from app.ideas.events import idea_events
+from app.ideas.search import warm_search_index
+from app.repositories.idea_repository import run_tombstone_pruner
 from app.repositories.user_repository import UserRepository, get_user_repository
+from app.static_assets import StaticAssets, use_fingerprinted_urls
+from app.users.avatars import warm_avatar_owners, UploadSizeLimitMiddleware
 from app.users.endpoints import user_router
-from logging_app.logging_utils import get_logger, log_request, log_response, log_and_return_error_response
+from app.users.thumbnails import thumbnail_pool
+from logging_app.logging_utils import get_logger, log_response, log_and_return_error_response, route_template, \
+    stop_logging
+from logging_app.metrics import metrics, record_request
 
 
 @asynccontextmanager
 async def application_lifespan(app: FastAPI):
-    print("starting")
+    logger.info(f"Worker {os.getpid()} is warming up")
+    # everything the first requests would otherwise pay for: connections, templates, caches, bcrypt processes
+    await warm_up_pool(settings.DB_WARM_CONNECTIONS)
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+    await warm_search_index()
+    await warm_avatar_owners()
+    password_pool.start()
+    thumbnail_pool.start()
+    await idea_events.start()
+    metrics.configure(settings.METRICS_DIR)
+    flusher = asyncio.create_task(metrics.run_flusher(settings.METRICS_FLUSH_INTERVAL))
+    pruner = asyncio.create_task(run_tombstone_pruner(settings.TOMBSTONE_PRUNE_INTERVAL))
+    logger.info(f"Worker {os.getpid()} is ready")
     yield
-    print("stopping")
-
-
-app = FastAPI(lifespan=application_lifespan)
+    logger.info(f"Worker {os.getpid()} is stopping")
+    # open event streams would otherwise hold the shutdown until their clients go away
+    await idea_events.stop()
+    flusher.cancel()
+    pruner.cancel()
+    await metrics.flush()
+    password_pool.shutdown()
+    thumbnail_pool.shutdown()
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
+    stop_logging()
+
+
+# orjson renders every dict an endpoint returns, the idea listings are sent already serialized
+app = FastAPI(lifespan=application_lifespan, default_response_class=ORJSONResponse)
 app.include_router(user_router)
 app.include_router(idea_router)
-logger = get_logger()
-app.mount("/static", StaticFiles(directory="app/static"), "static")
+logger = get_logger(json_format=settings.LOG_JSON, filename=settings.LOG_FILE, max_bytes=settings.LOG_MAX_BYTES,
+                    backup_count=settings.LOG_BACKUP_COUNT, success_sample_rate=settings.LOG_SUCCESS_SAMPLE_RATE)
+static_assets = StaticAssets()
+app.mount("/static", static_assets, "static")
 app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -39,7 +83,13 @@ app.add_middleware(
         allow_headers=["*"]
     )
 app.add_middleware(SessionMiddleware, secret_key=settings.SESSION_KEY)
+app.add_middleware(TokenRefreshMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(UploadSizeLimitMiddleware, path="/users/upload_ava")
+if read_engine is not None:
+    app.add_middleware(ReplicaStickinessMiddleware, sticky_seconds=settings.REPLICA_STICKY_SECONDS)
 templates = Jinja2Templates(directory="app/templates")
+use_fingerprinted_urls(templates, static_assets)
 
 @app.get("/")
 async def get_base(req: Request):
@@ -63,17 +113,39 @@ async def reg_form(req: Request):
 @app.middleware("http")
 async def log_requests_and_responses(request: Request, call_next):
     request_info = f"{request.method} {request.url}"
-    log_request(logger, request_info)
+    started = time.perf_counter()
+    query_stats = start_query_tracking()
+    metrics.add_gauge("http_requests_in_flight", 1)
     try:
         response = await call_next(request)
-        log_response(logger, response.status_code, request_info)
-        return response
     except Exception:
-        return log_and_return_error_response(logger, request_info, exc_info=True)
+        response = log_and_return_error_response(logger, request_info, exc_info=True, method=request.method,
+                                                 route=route_template(request),
+                                                 duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    else:
+        log_response(logger, response.status_code, request_info, method=request.method,
+                     route=route_template(request), duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    finally:
+        metrics.add_gauge("http_requests_in_flight", -1)
+    record_request(request.method, route_template(request), response.status_code, time.perf_counter() - started)
+    response.headers.append("Server-Timing", query_stats.server_timing())
+    for statement, times in query_stats.repeated(settings.REPEATED_QUERY_THRESHOLD):
+        logger.warning(f"Possible N+1: {times} x {statement}", extra={"route": route_template(request)})
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # other workers flush on their own timer, this one flushes now so its numbers are current
+    await metrics.flush()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 
 @app.get("/profile")
 async def get_profile(req: Request, session: UserRepository = Depends(get_user_repository), access_data: dict | bool = Depends(get_access_token)):
-    return templates.TemplateResponse(name="profile.html", context={"request": req, "user": await session.get_user_by_id(access_data), "ideas": await session.count_ideas(access_data)})
+    if not access_data:
+        return RedirectResponse("/login")
+    user, ideas_count = await session.get_profile(access_data)
+    return templates.TemplateResponse(name="profile.html", context={"request": req, "user": user, "ideas": ideas_count})
 
 
 
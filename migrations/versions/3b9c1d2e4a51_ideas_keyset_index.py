@@ -0,0 +1,26 @@
+"""ideas keyset index
+
+Revision ID: 3b9c1d2e4a51
+Revises: f7303fee7031
+Create Date: 2026-10-18 10:20:41.512307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1d2e4a51'
+down_revision: Union[str, None] = 'f7303fee7031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ideas_updated_at_idea_id', 'ideas', ['updated_at', 'idea_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ideas_updated_at_idea_id', table_name='ideas')
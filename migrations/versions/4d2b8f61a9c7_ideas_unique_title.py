@@ -0,0 +1,37 @@
+"""ideas unique title and (user_id, title) index
+
+Revision ID: 4d2b8f61a9c7
+Revises: e1a6b4c8f250
+Create Date: 2026-10-18 16:05:12.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d2b8f61a9c7'
+down_revision: Union[str, None] = 'e1a6b4c8f250'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # titles were only checked by a SELECT before the insert, racing adds may have left duplicates:
+    # all but the oldest get the id appended so the unique index can be built
+    op.execute(
+        "UPDATE ideas SET title = title || ' (' || idea_id || ')' "
+        "WHERE idea_id NOT IN (SELECT min(idea_id) FROM ideas GROUP BY title)"
+    )
+    op.create_index('ux_ideas_title', 'ideas', ['title'], unique=True)
+    op.create_index('ix_ideas_user_id_title', 'ideas', ['user_id', 'title'], unique=False)
+    # user_id leads the new index, the single column one is redundant
+    op.drop_index('ix_ideas_user_id', table_name='ideas')
+
+
+def downgrade() -> None:
+    op.create_index('ix_ideas_user_id', 'ideas', ['user_id'], unique=False)
+    op.drop_index('ix_ideas_user_id_title', table_name='ideas')
+    op.drop_index('ux_ideas_title', table_name='ideas')
@@ -0,0 +1,31 @@
+"""ideas search vector
+
+Revision ID: 8e4f2a7c9d13
+Revises: 3b9c1d2e4a51
+Create Date: 2026-10-18 10:41:07.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f2a7c9d13'
+down_revision: Union[str, None] = '3b9c1d2e4a51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ideas', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')", persisted=True), nullable=True))
+    op.create_index('ix_ideas_search_vector', 'ideas', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ideas_search_vector', table_name='ideas', postgresql_using='gin')
+    op.drop_column('ideas', 'search_vector')
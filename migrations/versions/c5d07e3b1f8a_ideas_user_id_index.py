@@ -0,0 +1,26 @@
+"""ideas user_id index
+
+Revision ID: c5d07e3b1f8a
+Revises: 8e4f2a7c9d13
+Create Date: 2026-10-18 11:32:54.918310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d07e3b1f8a'
+down_revision: Union[str, None] = '8e4f2a7c9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ideas_user_id', 'ideas', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ideas_user_id', table_name='ideas')
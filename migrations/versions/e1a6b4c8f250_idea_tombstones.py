@@ -0,0 +1,36 @@
+"""idea tombstones
+
+Revision ID: e1a6b4c8f250
+Revises: c5d07e3b1f8a
+Create Date: 2026-10-18 12:47:16.330174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a6b4c8f250'
+down_revision: Union[str, None] = 'c5d07e3b1f8a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('idea_tombstones',
+    sa.Column('tombstone_id', sa.Integer(), nullable=False),
+    sa.Column('idea_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('tombstone_id')
+    )
+    op.create_index('ix_idea_tombstones_deleted_at_idea_id', 'idea_tombstones', ['deleted_at', 'idea_id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idea_tombstones_deleted_at_idea_id', table_name='idea_tombstones')
+    op.drop_table('idea_tombstones')
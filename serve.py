@@ -0,0 +1,104 @@
+"""Production entry point: gunicorn managing uvicorn workers.
+
+    python serve.py
+
+The app is imported once in the master and forked into WEB_CONCURRENCY workers (one per core
+by default). `python main.py` stays the reloading development server."""
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+from gunicorn.util import import_app
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+from app.auth.password_pool import password_pool
+from app.database.config import settings
+from app.ideas.cache import idea_cache, build_cache_backend
+from app.ideas.events import idea_events
+from logging_app.logging_utils import share_log_file
+
+
+def worker_count() -> int:
+    return settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+class DrainingServer(Server):
+    async def shutdown(self, sockets=None):
+        # event streams never end on their own, they would hold the drain for the whole graceful timeout
+        idea_events.close_streams()
+        await super().shutdown(sockets)
+
+
+class AppWorker(UvicornWorker):
+    """uvloop and httptools whenever they are installed, in-flight requests get GRACEFUL_TIMEOUT to finish."""
+
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto", "timeout_graceful_shutdown": settings.GRACEFUL_TIMEOUT}
+
+    async def _serve(self):
+        # UvicornWorker._serve with the draining server
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+
+# created by on_starting when several workers run without METRICS_DIR, removed again by on_exit
+temporary_metrics_dir: str | None = None
+
+
+def on_starting(server):
+    global temporary_metrics_dir
+    if not settings.METRICS_DIR:
+        if server.cfg.workers > 1:
+            # without a shared directory /metrics would answer with the counts of whichever worker it hit;
+            # set in the master, the workers see it after the fork
+            temporary_metrics_dir = settings.METRICS_DIR = tempfile.mkdtemp(prefix="ideas-metrics-")
+        return
+    # snapshots of the previous run's workers would be summed with the new ones
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        os.remove(path)
+
+
+def on_exit(server):
+    if temporary_metrics_dir:
+        shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        app = import_app(self.app_uri)
+        # version bumps of the in-process idea cache stay in the worker that made the write
+        idea_cache.backend = build_cache_backend(self.options["workers"])
+        password_pool.share_cores(self.options["workers"])
+        if self.options["workers"] > 1:
+            # the forked workers would rotate the one log file under each other
+            share_log_file()
+        return app
+
+
+if __name__ == "__main__":
+    ProductionServer("main:app", {
+        "bind": settings.BIND,
+        "workers": worker_count(),
+        "worker_class": AppWorker,
+        "preload_app": True,
+        "graceful_timeout": settings.GRACEFUL_TIMEOUT,
+        "on_starting": on_starting,
+        "on_exit": on_exit,
+    }).run()
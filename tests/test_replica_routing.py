@@ -0,0 +1,108 @@
+"""Replica routing against the database from .env.
+
+Two engines are opened on DB_URL, one standing in for the replica, and every statement is recorded
+on the engine that executed it. The checks assert where the queries actually went, not what
+get_bind answers. Nothing is written: DML matches no rows and every session rolls back.
+
+    python -m pytest tests/test_replica_routing.py
+    python -m tests.test_replica_routing
+"""
+import asyncio
+
+from sqlalchemy import event, false, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from app.database.config import build_engine, settings
+from app.database.models import Idea
+from app.database.routing import RoutingSession, read_only, on_primary, sticky_primary, request_wrote
+
+READ = select(Idea.idea_id).limit(1)
+WRITE = update(Idea).where(false()).values(title=Idea.title)
+
+
+async def reached(scenario) -> set[str]:
+    """Runs scenario(session) and returns the names of the engines its statements were executed on."""
+    primary, replica = build_engine(settings.DB_URL, "primary"), build_engine(settings.DB_URL, "replica")
+    executed_on: list[str] = []
+    for name, engine in (("primary", primary), ("replica", replica)):
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda *args, name=name: executed_on.append(name))
+    session_maker = async_sessionmaker(bind=primary, class_=AsyncSession, sync_session_class=RoutingSession,
+                                       info={"replica": replica})
+    try:
+        async with session_maker() as session:
+            await scenario(session)
+            await session.rollback()
+    finally:
+        await primary.dispose()
+        await replica.dispose()
+    return set(executed_on)
+
+
+async def plain_read(session):
+    await session.execute(READ)
+
+
+@read_only
+async def replica_read(session):
+    await session.execute(READ)
+
+
+@read_only
+async def write_in_read_only(session):
+    await session.execute(WRITE)
+
+
+@read_only
+async def primary_read_in_read_only(session):
+    with on_primary():
+        await session.execute(READ)
+
+
+async def sticky_read(session):
+    token = sticky_primary.set(True)
+    try:
+        await replica_read(session)
+    finally:
+        sticky_primary.reset(token)
+
+
+async def read_after_commit(session):
+    token = request_wrote.set([False])
+    try:
+        await session.execute(READ)
+        await session.commit()
+        await replica_read(session)
+    finally:
+        request_wrote.reset(token)
+
+
+def test_unmarked_read_goes_to_primary():
+    assert asyncio.run(reached(plain_read)) == {"primary"}
+
+
+def test_read_only_read_goes_to_replica():
+    assert asyncio.run(reached(replica_read)) == {"replica"}
+
+
+def test_dml_in_read_only_goes_to_primary():
+    assert asyncio.run(reached(write_in_read_only)) == {"primary"}
+
+
+def test_on_primary_overrides_read_only():
+    assert asyncio.run(reached(primary_read_in_read_only)) == {"primary"}
+
+
+def test_sticky_client_reads_primary():
+    assert asyncio.run(reached(sticky_read)) == {"primary"}
+
+
+def test_request_that_committed_keeps_reading_primary():
+    assert asyncio.run(reached(read_after_commit)) == {"primary"}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")